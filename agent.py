@@ -1,32 +1,56 @@
 # agent.py: Main agent loop orchestrating everything
 
 
+import argparse
+import multiprocessing
 import os
-import time
+import signal
+from concurrent.futures import ProcessPoolExecutor
 from memory import load_memory, save_memory, clear_memory_file
-from categorization import load_tickets, assign_ticket_to_category, create_category, merge_categories, rename_category
-from embeddings import get_embedding
-from llm import llm_suggest_category_name, llm_merge_decision
-from decision import adjust_threshold, decide_next_action
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
+from categorization import (assign_ticket_to_category, assign_tickets_batch, create_category, create_categories_batch, add_category,
+	add_to_category, category_exemplars, merge_categories, rename_category, resolve_category, parse_category_name)
+from clustering import CLUSTER_NEW_TICKETS, CLUSTER_BUFFER_SIZE, CLUSTER_THRESHOLD
+from checkpoint import ResultsLog
+from ticket_io import iter_ticket_chunks, sample_tickets, TicketWriter, TICKET_CHUNK_SIZE
+from parallel import categorize_parallel, init_worker, AGENT_WORKERS
+from cache import content_hash
+from embeddings import get_embedding, get_embeddings
+from category_index import CategoryIndex
+from exemplar_index import ExemplarIndex, ASSIGN_MODE, KNN_K
+from merge_candidates import MergeTracker, find_merge_candidates, MERGE_INTERVAL
+from llm import llm_suggest_category_name, llm_suggest_category_names, llm_merge_decisions
+from decision import adjust_threshold, decide_next_action, ThresholdController, THRESHOLD_MODE, THRESHOLD_INTERVAL
+from metrics import get_logger, set_log_level, metrics, span, incr
+
+log = get_logger(__name__)
 
 DATA_DIR = 'data'
 TICKETS_FILE = os.path.join(DATA_DIR, 'tickets.xlsx')
 MEMORY_FILE = os.path.join(DATA_DIR, 'category_memory.json')
+# Working memory is journaled to a binary store during the run and exported to MEMORY_FILE once at the end
+MEMORY_STORE = os.path.join(DATA_DIR, 'category_memory')
 OUTPUT_FILE = os.path.join(DATA_DIR, 'tickets_categorized.xlsx')
+# Per-ticket assignments are appended here during the run; OUTPUT_FILE is written once at the end
+RESULTS_LOG = os.path.join(DATA_DIR, 'tickets_categorized.results.jsonl')
+
+# Columns tried, in order, as a stable ticket identifier before falling back to a content hash
+TICKET_ID_COLUMNS = ['Incident ID*+', 'Incident ID', 'Ticket ID', 'ID']
+
+# Set by SIGUSR1 to force a checkpoint at the end of the current step
+_checkpoint_requested = False
+# Set by SIGTERM to stop at the end of the current step
+_terminate_signal = None
 
 
 def select_text_column(df):
-	print("[select_text_column] Called. Columns:", df.columns)
+	log.debug("Columns: %s", list(df.columns))
 	# If 'Description' exists, use it
 	if 'Description' in df.columns:
-		print("[select_text_column] Using 'Description' column.")
+		log.info("Using 'Description' column.")
 		return 'Description'
 	# Otherwise, pick the text column with the highest mean text length
 	text_cols = [col for col in df.columns if df[col].dtype == object]
-	print(f"[select_text_column] Text columns found: {text_cols}")
+	log.debug("Text columns found: %s", text_cols)
 	if not text_cols:
 		raise ValueError('No text columns found in the tickets file.')
 	best_col = None
@@ -34,129 +58,404 @@ def select_text_column(df):
 	for col in text_cols:
 		texts = df[col].astype(str).fillna('')
 		mean_len = texts.str.len().mean()
-		print(f"[select_text_column] Checking column: {col}, mean length: {mean_len}")
+		log.debug("Checking column: %s, mean length: %s", col, mean_len)
 		if mean_len > best_len:
 			best_len = mean_len
 			best_col = col
 	if best_col is None:
 		raise ValueError('No suitable text column found for ticket description.')
-	print(f"[select_text_column] Selected column: {best_col}")
+	log.info("Selected column: %s", best_col)
 	return best_col
 
-def main():
-	# Clear the memory file at the start of each run
-	clear_memory_file(MEMORY_FILE)
-	start_time = time.time()
-	print("[main] Loading tickets from:", TICKETS_FILE)
-	tickets_df = load_tickets(TICKETS_FILE)
-	print("[main] Tickets loaded. Shape:", tickets_df.shape)
-	text_col = select_text_column(tickets_df)
-	print(f"[main] Using text column: {text_col}")
-	memory = load_memory(MEMORY_FILE)
-	print(f"[main] Loaded memory. Categories: {list(memory.get('categories', {}).keys())}")
-	threshold = 0.75
-	print(f"[main] Initial threshold: {threshold}")
-	tickets_df['Category'] = None
-	unprocessed = set(tickets_df.index)
-	print(f"[main] Unprocessed tickets: {len(unprocessed)}")
-
-	while unprocessed or optimizations_possible(memory):
-		print(f"[main] Loop start. Unprocessed: {len(unprocessed)}")
+def select_id_column(df):
+	"""Return the first known ticket ID column present in df, or None."""
+	for col in TICKET_ID_COLUMNS:
+		if col in df.columns:
+			log.info("Using ticket ID column: %s", col)
+			return col
+	log.info("No ticket ID column found. Falling back to content hashes.")
+	return None
+
+def ticket_keys(df, text_col, id_col):
+	"""Stable per-ticket keys: the ticket ID when present, else a hash of the ticket text."""
+	texts = df[text_col].astype(str)
+	if id_col is None:
+		return texts.map(lambda t: 'sha256:' + content_hash(t))
+	keys = df[id_col].astype(str).str.strip()
+	missing = df[id_col].isna() | (keys == '')
+	keys[missing] = texts[missing].map(lambda t: 'sha256:' + content_hash(t))
+	return keys
+
+def _request_checkpoint(signum, frame):
+	global _checkpoint_requested
+	_checkpoint_requested = True
+
+def _terminate(signum, frame):
+	# Only flag it: raising here could interrupt a memory save between its file replacements
+	global _terminate_signal
+	_terminate_signal = signum
+
+def exit_if_terminating():
+	"""Raise SystemExit after SIGTERM; called between steps so main()'s finally block checkpoints."""
+	if _terminate_signal is not None:
+		log.warning("Terminated by signal %s; checkpointing and exiting.", _terminate_signal)
+		raise SystemExit(128 + _terminate_signal)
+
+def install_signal_handlers():
+	signal.signal(signal.SIGTERM, _terminate)
+	if hasattr(signal, 'SIGUSR1'):
+		signal.signal(signal.SIGUSR1, _request_checkpoint)
+
+def checkpoint(results_log, memory):
+	"""Persist buffered results and the memory journal together so a resumed run sees a consistent state."""
+	global _checkpoint_requested
+	_checkpoint_requested = False
+	with span('checkpoint'):
+		results_log.flush()
+		save_memory(MEMORY_STORE, memory)
+
+def write_output(input_file, output_file, text_col, id_col, results, memory, skip_keys=None, previous_file=None,
+		chunk_size=TICKET_CHUNK_SIZE):
+	"""Stream the categorized tickets to output_file (.xlsx, .csv or .jsonl) in one pass.
+
+	Input chunks are re-read and labelled from results (ticket key -> category),
+	with merge/rename aliases resolved. Rows of previous_file whose key is not in
+	skip_keys (incremental mode) are written ahead of this run's tickets, their
+	categories resolved the same way. The file is written under a temporary name
+	and moved into place at the end.
+	"""
+	root, ext = os.path.splitext(output_file)
+	partial = f"{root}.partial{ext}"
+	log.info("Writing tickets to: %s", output_file)
+	with span('output.write'), TicketWriter(partial) as writer:
+		if previous_file and os.path.exists(previous_file):
+			for chunk in iter_ticket_chunks(previous_file, chunk_size, [text_col] + TICKET_ID_COLUMNS):
+				if text_col in chunk.columns:
+					keys = ticket_keys(chunk, text_col, select_id_column(chunk))
+					chunk = chunk[~keys.isin(skip_keys)]
+				if 'Category' in chunk.columns:
+					# Categories merged or renamed since the previous run get their current name
+					chunk = chunk.assign(Category=chunk['Category'].map(
+						lambda c: resolve_category(c, memory) if isinstance(c, str) else c))
+				writer.write(chunk)
+			log.info("Kept %s tickets from previous output: %s", writer.rows, previous_file)
+		for chunk in iter_ticket_chunks(input_file, chunk_size, [text_col, id_col]):
+			keys = ticket_keys(chunk, text_col, id_col)
+			chunk['Category'] = keys.map(lambda k: resolve_category(results[k], memory) if k in results else None)
+			writer.write(chunk)
+	os.replace(partial, output_file)
+	log.info("Wrote %s tickets.", writer.rows)
+
+def main(resume=False, incremental=False, output_file=OUTPUT_FILE, input_file=TICKETS_FILE, chunk_size=TICKET_CHUNK_SIZE,
+		workers=AGENT_WORKERS, cluster_new=CLUSTER_NEW_TICKETS, assign_mode=ASSIGN_MODE, metrics_json=None):
+	"""Categorize input_file chunk by chunk.
+
+	resume: continue an interrupted run from the results log and memory store.
+	incremental: keep memory and the results log from previous runs, categorize only
+	tickets whose key has not been seen before and append them to the previous output.
+	workers: when > 1, each chunk is sharded across a process pool (see parallel.py)
+	and the shard memories are reconciled before the merge pass.
+	cluster_new: buffer tickets that match no category, cluster them locally and
+	name each cluster with one LLM call instead of creating a category per ticket.
+	assign_mode: 'centroid' matches tickets to category centroids, 'knn' votes over
+	the k nearest stored ticket exemplars (see exemplar_index.py).
+	metrics_json: also write the end-of-run metrics (see metrics.py) to this file.
+	"""
+	results_log = ResultsLog(RESULTS_LOG)
+	if resume or incremental:
+		log.info("%s.", 'Incremental run' if incremental else 'Resuming from previous checkpoint')
+		recorded = results_log.load()
+	else:
+		# Clear the memory file and results log at the start of each run
+		clear_memory_file(MEMORY_STORE)
+		results_log.reset()
+		recorded = {}
+	install_signal_handlers()
+	metrics.reset()
+	log.info("Sampling tickets from: %s", input_file)
+	# Column detection only needs a sample, so the full file is never loaded at once
+	sample = sample_tickets(input_file)
+	text_col = select_text_column(sample)
+	log.info("Using text column: %s", text_col)
+	id_col = select_id_column(sample)
+	memory = load_memory(MEMORY_STORE)
+	log.info("Loaded memory. Categories: %s", len(memory.get('categories', {})))
+	run = {
+		'memory': memory,
+		'index': CategoryIndex.from_memory(memory),
+		'threshold': 0.75,
+		# Best-match similarity statistics for the local threshold controller (see decision.py)
+		'threshold_controller': ThresholdController(),
+		'tickets_since_threshold': 0,
+		'merge_tracker': MergeTracker.from_memory(memory),
+		'pending_merges': [],
+		'tickets_since_merge': 0,
+		'results_log': results_log,
+		'recorded': recorded,
+		# Unmatched (key, ticket, summary) tuples waiting for a clustering pass when cluster_new is set
+		'cluster_new': cluster_new,
+		'unmatched': [],
+		# Exemplar ANN index for kNN assignment, None in centroid mode
+		'exemplars': ExemplarIndex.from_memory(memory, get_embeddings,
+			# Examples are stored from 'Summary*' when present; only those can stand in for text_col
+			embed_examples=text_col == 'Summary*' or 'Summary*' not in sample.columns) if assign_mode == 'knn' else None,
+	}
+	log.info("Initial threshold: %s", run['threshold'])
+	if run['exemplars'] is not None and workers > 1:
+		log.warning("Shard workers assign by centroid; kNN assignment only applies to single-process runs.")
+	seen_keys = set()
+	# spawn rather than fork: the parent holds SQLite connections and LLM client threads
+	pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+		initializer=init_worker, initargs=(workers,)) if workers > 1 else None
+	try:
+		for chunk in iter_ticket_chunks(input_file, chunk_size, [text_col, id_col]):
+			exit_if_terminating()
+			keys = ticket_keys(chunk, text_col, id_col)
+			seen_keys.update(keys)
+			if pool is not None:
+				categorize_chunk_parallel(chunk, keys, text_col, run, pool, workers)
+			# With a pool every ticket is already recorded, so this only runs the merge passes
+			categorize_chunk(chunk, keys, text_col, run)
+	finally:
+		if pool is not None:
+			pool.shutdown()
+		checkpoint(results_log, memory)
+
+	write_output(input_file, output_file, text_col, id_col, recorded, memory,
+		skip_keys=seen_keys, previous_file=output_file if incremental else None, chunk_size=chunk_size)
+	save_memory(MEMORY_FILE, memory)
+	log.info("Categorization complete. Output: %s, updated memory: %s", output_file, MEMORY_FILE)
+	log.info("%s", metrics.report())
+	if metrics_json:
+		metrics.dump_json(metrics_json)
+
+def _record(run, key, category):
+	run['recorded'][key] = category
+	run['results_log'].record(key, category)
+
+def _add_exemplar(run, category, embedding):
+	if run['exemplars'] is not None and run['exemplars'].add(category, embedding):
+		incr('exemplars.stored')
+
+def categorize_chunk_parallel(tickets_df, keys, text_col, run, pool, workers):
+	"""Categorize a chunk's unprocessed tickets on the process pool and record the reconciled labels."""
+	has_summary = 'Summary*' in tickets_df.columns
+	tickets = []
+	for idx in tickets_df.index:
+		if keys[idx] in run['recorded']:
+			continue
+		ticket = str(tickets_df.loc[idx, text_col])
+		summary_value = str(tickets_df.loc[idx, 'Summary*']) if has_summary else ticket
+		tickets.append((keys[idx], ticket, summary_value))
+	log.info("Sharding %s tickets across %s workers", len(tickets), workers)
+	labels = categorize_parallel(tickets, run['memory'], run['index'], run['threshold'], pool, workers,
+		cluster_threshold=cluster_threshold(run) if run['cluster_new'] else None, controller=run['threshold_controller'])
+	run['tickets_since_threshold'] += len(labels)
+	for key, cat in labels.items():
+		_record(run, key, cat)
+	if run['results_log'].due() or _checkpoint_requested:
+		checkpoint(run['results_log'], run['memory'])
+	exit_if_terminating()
+
+def categorize_chunk(tickets_df, keys, text_col, run):
+	"""Run the decision loop over one chunk of tickets, updating run['memory'] and run['recorded'].
+
+	run holds the state shared across chunks: memory, index, threshold and its
+	controller, merge tracker and pending merges, the unmatched-ticket buffer
+	and the results log.
+	"""
+	memory = run['memory']
+	index = run['index']
+	results_log = run['results_log']
+	unprocessed = {idx for idx in tickets_df.index if keys[idx] not in run['recorded']}
+	log.info("Rows %s-%s. Already categorized: %s", tickets_df.index[0], tickets_df.index[-1], len(tickets_df) - len(unprocessed))
+	log.info("Unprocessed tickets: %s", len(unprocessed))
+
+	# Loop at least until the end-of-chunk merge pass, also when every ticket was already recorded (shard workers)
+	chunk_merged = False
+	while unprocessed or run['unmatched'] or run['pending_merges'] or not chunk_merged or optimizations_possible(memory):
+		log.debug("Loop start. Unprocessed: %s", len(unprocessed))
 		state = {
 			'unprocessed_tickets': bool(unprocessed),
 			'need_create': False,
 			'can_merge': False,
-			'can_rename': False
+			'can_rename': False,
+			'threshold_due': THRESHOLD_MODE != 'off' and THRESHOLD_INTERVAL > 0
+				and run['tickets_since_threshold'] >= THRESHOLD_INTERVAL,
 		}
-		# Check for possible merges (simple pairwise check)
-		cats = list(memory.get('categories', {}).keys())
-		for i in range(len(cats)):
-			for j in range(i+1, len(cats)):
-				name_a, name_b = cats[i], cats[j]
-				ex_a = memory['categories'][name_a]['examples'][:2]
-				ex_b = memory['categories'][name_b]['examples'][:2]
-				print(f"[main] Checking merge: {name_a} <-> {name_b}")
-				resp = llm_merge_decision(name_a, ex_a, name_b, ex_b)
-				print(f"[main] Merge decision response: {resp}")
-				if 'YES' in resp.upper():
-					print(f"[main] Merge possible: {name_a}, {name_b}")
-					state['can_merge'] = (name_a, name_b)
-					break
-			if state['can_merge']:
+		# Name buffered unmatched tickets once the buffer is full or the chunk is exhausted
+		if run['unmatched'] and (not unprocessed or len(run['unmatched']) >= CLUSTER_BUFFER_SIZE):
+			flush_unmatched(run)
+		# Periodic merge pass: only the most similar unjudged centroid pairs go to the LLM
+		merge_due = not unprocessed or (MERGE_INTERVAL and run['tickets_since_merge'] >= MERGE_INTERVAL)
+		if merge_due and not run['pending_merges']:
+			run['tickets_since_merge'] = 0
+			run['pending_merges'] = run_merge_pass(memory, index, run['merge_tracker'])
+			chunk_merged = not unprocessed
+			# A due threshold adjustment still runs before leaving the chunk
+			if not unprocessed and not run['pending_merges'] and not state['threshold_due']:
 				break
+		# Drop merges made stale by an earlier merge in the same pass
+		run['pending_merges'] = [(a, b) for a, b in run['pending_merges'] if a in index and b in index]
+		if run['pending_merges']:
+			state['can_merge'] = run['pending_merges'].pop(0)
 		# Check for possible renames (not implemented, placeholder)
 		# ...
 
-		print(f"[main] State before decision: {state}")
+		log.debug("State before decision: %s", state)
 		action = decide_next_action(state)
-		print(f"[main] Decided action: {action}")
+		log.debug("Decided action: %s", action)
 
 		if action == 'assign' and unprocessed:
 			idx = unprocessed.pop()
+			run['tickets_since_merge'] += 1
+			run['tickets_since_threshold'] += 1
 			ticket = str(tickets_df.loc[idx, text_col])
 			summary_value = str(tickets_df.loc[idx, 'Summary*']) if 'Summary*' in tickets_df.columns else ticket
-			print(f"[main] Assigning ticket idx {idx}: {ticket}")
-			cat = assign_ticket_to_category(ticket, memory, threshold, get_embedding)
-			print(f"[main] Assigned to category: {cat}")
+			log.debug("Assigning ticket idx %s: %s", idx, ticket)
+			cat = assign_ticket_to_category(ticket, memory, run['threshold'], get_embedding, index=index,
+				controller=run['threshold_controller'], exemplars=run['exemplars'], k=KNN_K)
+			log.debug("Assigned to category: %s", cat)
 			if cat:
-				tickets_df.at[idx, 'Category'] = cat
-				memory['categories'][cat]['examples'].append(summary_value)
+				_record(run, keys[idx], cat)
+				# The embedding is memoized, so this does not re-encode the ticket
+				ticket_emb = get_embedding(ticket)
+				add_to_category(cat, summary_value, ticket_emb, memory, index)
+				_add_exemplar(run, cat, ticket_emb)
+				incr('tickets.assigned')
+			elif run['cluster_new']:
+				run['unmatched'].append((keys[idx], ticket, summary_value))
 			else:
-				print(f"[main] No suitable category found. Creating new category immediately.")
+				log.debug("No suitable category found. Creating new category immediately.")
 				llm_response, ticket_emb = create_category(ticket, memory, get_embedding, llm_suggest_category_name)
-				print(f"[main] LLM response: {llm_response}")
-				cat_name = llm_response.strip().splitlines()[0]
-				if 'uncategorized' in cat_name.lower():
-					print(f"[main] LLM could not suggest a category. Assigning default: Uncategorized")
-					cat_name = 'Uncategorized'
-				print(f"[main] Created category: {cat_name}")
-				tickets_df.at[idx, 'Category'] = cat_name
+				log.debug("LLM response: %s", llm_response)
+				cat_name = resolve_category(parse_category_name(llm_response), memory)
+				log.debug("Created category: %s", cat_name)
+				_record(run, keys[idx], cat_name)
 				# Update memory with new category, storing summary in examples
-				if 'categories' not in memory:
-					memory['categories'] = {}
-				memory['categories'][cat_name] = {'examples': [summary_value], 'embedding': ticket_emb}
+				if add_category(cat_name, [summary_value], ticket_emb, memory, index):
+					incr('categories.created')
+				_add_exemplar(run, cat_name, ticket_emb)
 		elif action == 'create' and unprocessed:
 			idx = unprocessed.pop()
+			run['tickets_since_merge'] += 1
+			run['tickets_since_threshold'] += 1
 			ticket = str(tickets_df.loc[idx, text_col])
 			summary_value = str(tickets_df.loc[idx, 'Summary*']) if 'Summary*' in tickets_df.columns else ticket
-			print(f"[main] Creating new category for ticket idx {idx}: {ticket}")
+			log.debug("Creating new category for ticket idx %s: %s", idx, ticket)
 			llm_response, ticket_emb = create_category(ticket, memory, get_embedding, llm_suggest_category_name)
-			print(f"[main] LLM response: {llm_response}")
-			cat_name = llm_response.strip().splitlines()[0]
-			if 'uncategorized' in cat_name.lower():
-				print(f"[main] LLM could not suggest a category. Assigning default: Uncategorized")
-				cat_name = 'Uncategorized'
-			print(f"[main] Created category: {cat_name}")
-			tickets_df.at[idx, 'Category'] = cat_name
-			if 'categories' not in memory:
-				memory['categories'] = {}
-			memory['categories'][cat_name] = {'examples': [summary_value], 'embedding': ticket_emb}
+			log.debug("LLM response: %s", llm_response)
+			cat_name = resolve_category(parse_category_name(llm_response), memory)
+			log.debug("Created category: %s", cat_name)
+			_record(run, keys[idx], cat_name)
+			if add_category(cat_name, [summary_value], ticket_emb, memory, index):
+				incr('categories.created')
+			_add_exemplar(run, cat_name, ticket_emb)
 		elif action == 'merge' and state['can_merge']:
 			cat_a, cat_b = state['can_merge']
-			print(f"[main] Merging categories: {cat_a}, {cat_b}")
-			merge_categories(cat_a, cat_b, memory)
+			log.info("Merging categories: %s, %s", cat_a, cat_b)
+			merge_categories(cat_a, cat_b, memory, index=index)
+			run['threshold_controller'].merge_category(cat_a, cat_b)
+			if run['exemplars'] is not None:
+				run['exemplars'].relabel(cat_b, cat_a)
 		elif action == 'rename' and state['can_rename']:
 			# Placeholder for rename logic
-			print(f"[main] Rename action selected, but not implemented.")
+			log.info("Rename action selected, but not implemented.")
 			pass
 		elif action == 'adjust_threshold':
-			print(f"[main] Adjusting threshold. Current: {threshold}")
-			threshold = adjust_threshold(memory, threshold)
-			print(f"[main] New threshold: {threshold}")
+			run['tickets_since_threshold'] = 0
+			previous = run['threshold']
+			run['threshold'] = adjust_threshold(memory, previous, controller=run['threshold_controller'])
+			if run['threshold'] != previous:
+				log.info("Threshold adjusted: %s -> %s", previous, run['threshold'])
+
+		if results_log.due() or _checkpoint_requested:
+			checkpoint(results_log, memory)
+		exit_if_terminating()
+
+def cluster_threshold(run):
+	return float(CLUSTER_THRESHOLD) if CLUSTER_THRESHOLD else run['threshold']
+
+def flush_unmatched(run):
+	"""Cluster the buffered unmatched tickets and create one category per cluster.
 
-		print(f"[main] Saving memory and tickets.")
-		save_memory(MEMORY_FILE, memory)
-		tickets_df.to_excel(OUTPUT_FILE, index=False)
+	Tickets are re-scored first, since categories may have been created or
+	merged since they were buffered.
+	"""
+	buffered = run['unmatched']
+	run['unmatched'] = []
+	memory = run['memory']
+	log.info("Clustering %s unmatched tickets", len(buffered))
+	embeddings, matches = assign_tickets_batch([ticket for _, ticket, _ in buffered], run['threshold'], get_embeddings, run['index'],
+		k=KNN_K, exemplars=run['exemplars'])
+	remaining = []
+	for i, ((key, _, summary), match) in enumerate(zip(buffered, matches)):
+		if match:
+			_record(run, key, match[0][0])
+			add_to_category(match[0][0], summary, embeddings[i], memory, run['index'])
+			_add_exemplar(run, match[0][0], embeddings[i])
+			incr('tickets.assigned')
+		else:
+			remaining.append(i)
+	if not remaining:
+		return
+	new_categories = create_categories_batch([buffered[i][1] for i in remaining], embeddings[remaining],
+		cluster_threshold(run), llm_suggest_category_names)
+	for llm_response, _, members in new_categories:
+		cat_name = resolve_category(parse_category_name(llm_response), memory)
+		log.debug("Cluster of %s tickets named: %s", len(members), cat_name)
+		rows = [remaining[i] for i in members]
+		for i in rows:
+			_record(run, buffered[i][0], cat_name)
+		if add_category(cat_name, [buffered[i][2] for i in rows], embeddings[rows].mean(axis=0), memory, run['index']):
+			incr('categories.created')
+		for i in rows:
+			_add_exemplar(run, cat_name, embeddings[i])
+		incr('tickets.clustered', len(members))
 
-	print(f"Categorization complete. Output: {OUTPUT_FILE}\nUpdated memory: {MEMORY_FILE}")
-	end_time = time.time()
-	elapsed = end_time - start_time
-	elapsed_minutes = elapsed / 60
-	print(f"[main] Total time taken: {elapsed_minutes:.2f} minutes")
+def run_merge_pass(memory, index, tracker):
+	"""Ask the LLM about the top merge candidates and return the confirmed (cat_a, cat_b) pairs."""
+	confirmed = []
+	candidates = find_merge_candidates(index, tracker=tracker)
+	incr('merge.candidates', len(candidates))
+	pairs = [
+		(name_a, category_exemplars(memory['categories'][name_a], 2), name_b, category_exemplars(memory['categories'][name_b], 2))
+		for name_a, name_b, _ in candidates
+	]
+	# The candidate pairs are independent, so judge them concurrently
+	responses = llm_merge_decisions(pairs)
+	for (name_a, name_b, sim), resp in zip(candidates, responses):
+		log.debug("Merge %s <-> %s (similarity %.3f): %s", name_a, name_b, sim, resp)
+		decision = 'YES' in resp.upper()
+		tracker.record(name_a, name_b, index, decision, sim)
+		if decision:
+			confirmed.append((name_a, name_b))
+	if candidates:
+		# Persisted with the memory at the next checkpoint
+		tracker.save_to(memory)
+	return confirmed
 
 def optimizations_possible(memory):
 	# Placeholder: could check for merge/rename opportunities
 	return False
 
 if __name__ == '__main__':
-	main()
+	parser = argparse.ArgumentParser(description='Autonomous ticket categorization agent')
+	parser.add_argument('--resume', action='store_true', help='continue an interrupted run, skipping tickets already recorded in the results log')
+	parser.add_argument('--incremental', action='store_true', help='keep memory from previous runs and only categorize tickets not seen before')
+	parser.add_argument('--input', default=TICKETS_FILE, help='ticket file (.xlsx, .csv, .jsonl or .parquet)')
+	parser.add_argument('--output', default=OUTPUT_FILE, help='output file (.xlsx, .csv or .jsonl)')
+	parser.add_argument('--chunk-size', type=int, default=TICKET_CHUNK_SIZE, help='tickets read and processed per chunk')
+	parser.add_argument('--workers', type=int, default=AGENT_WORKERS, help='worker processes for sharded categorization (1 = single process)')
+	parser.add_argument('--cluster-new', action='store_true', default=CLUSTER_NEW_TICKETS,
+		help='buffer tickets that match no category and name them per cluster (see clustering.py)')
+	parser.add_argument('--assign', choices=['centroid', 'knn'], default=ASSIGN_MODE,
+		help="'knn' assigns by top-k vote over stored ticket exemplars instead of category centroids")
+	parser.add_argument('--log-level', help='DEBUG, INFO, WARNING or ERROR (default: LOG_LEVEL env or INFO)')
+	parser.add_argument('--metrics-json', help='write counters and timing spans for the run to this JSON file')
+	args = parser.parse_args()
+	if args.log_level:
+		set_log_level(args.log_level)
+	main(resume=args.resume, incremental=args.incremental, output_file=args.output,
+		input_file=args.input, chunk_size=args.chunk_size, workers=args.workers,
+		cluster_new=args.cluster_new, assign_mode=args.assign, metrics_json=args.metrics_json)
@@ -0,0 +1,160 @@
+# run_benchmark.py: Offline throughput benchmark for agent.main on synthetic tickets
+#
+#   python benchmarks/run_benchmark.py --sizes 1000,10000,100000 --latency 0.05 --json bench.json
+#
+# Each size runs agent.main in a fresh subprocess (so peak RSS is per run) inside a
+# temporary working directory, against the local stub LLM server, with cold caches.
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_llm_server import StubLLMServer
+from synthetic_tickets import generate_tickets, write_tickets
+
+
+def _child(workdir, input_file, output_file, chunk_size, workers):
+	"""Run agent.main in this process and write timings to result.json."""
+	import resource
+	sys.path.insert(0, REPO_DIR)
+	os.chdir(workdir)
+	os.makedirs('data', exist_ok=True)
+	timings = {'embedding': 0.0, 'input_read': 0.0, 'output_write': 0.0, 'checkpoint': 0.0}
+	depth = {'write': 0}
+
+	def timed(fn, bucket):
+		def wrapper(*args, **kwargs):
+			start = time.perf_counter()
+			if bucket == 'output_write':
+				depth['write'] += 1
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				if bucket == 'output_write':
+					depth['write'] -= 1
+				timings[bucket] += time.perf_counter() - start
+		return wrapper
+
+	def timed_chunks(fn):
+		def wrapper(*args, **kwargs):
+			chunks = fn(*args, **kwargs)
+			while True:
+				start = time.perf_counter()
+				try:
+					chunk = next(chunks)
+				except StopIteration:
+					return
+				finally:
+					# Reads done while writing the output are part of output_write
+					if not depth['write']:
+						timings['input_read'] += time.perf_counter() - start
+				yield chunk
+		return wrapper
+
+	# Patch before importing agent, which binds these names at import time
+	import embeddings
+	import ticket_io
+	embeddings.get_embeddings = timed(embeddings.get_embeddings, 'embedding')
+	ticket_io.iter_ticket_chunks = timed_chunks(ticket_io.iter_ticket_chunks)
+	import agent
+	agent.write_output = timed(agent.write_output, 'output_write')
+	agent.checkpoint = timed(agent.checkpoint, 'checkpoint')
+
+	start = time.perf_counter()
+	with open('agent.log', 'w', encoding='utf-8') as log:
+		stdout = sys.stdout
+		sys.stdout = log
+		try:
+			agent.main(input_file=input_file, output_file=output_file, chunk_size=chunk_size, workers=workers,
+				metrics_json='metrics.json')
+		finally:
+			sys.stdout = stdout
+	elapsed = time.perf_counter() - start
+	result = {
+		'elapsed': elapsed,
+		'embedding_time': timings['embedding'],
+		'io_time': timings['input_read'] + timings['output_write'] + timings['checkpoint'],
+		'timings': timings,
+		# ru_maxrss is in KiB on Linux
+		'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+	}
+	with open('metrics.json', encoding='utf-8') as f:
+		result['metrics'] = json.load(f)
+	with open('result.json', 'w', encoding='utf-8') as f:
+		json.dump(result, f)
+
+
+def run_size(n, args, server):
+	with tempfile.TemporaryDirectory(prefix=f'bench_{n}_') as workdir:
+		input_file = os.path.join(workdir, 'tickets.csv')
+		write_tickets(generate_tickets(n, args.categories, args.duplicate_rate, args.seed), input_file)
+		env = dict(os.environ)
+		env.update({
+			'OPENROUTER_API_BASE': server.api_base,
+			'OPENROUTER_API_KEY': 'stub',
+			'EMBEDDING_MODEL': args.embedder,
+			'EMBEDDING_CACHE_PATH': os.path.join(workdir, 'embedding_cache.sqlite'),
+			'LLM_CACHE_PATH': os.path.join(workdir, 'llm_cache.sqlite'),
+			'LLM_RATE_LIMIT': '0',
+		})
+		server.reset()
+		cmd = [sys.executable, os.path.abspath(__file__), '--child', workdir, input_file,
+			os.path.join(workdir, 'out.csv'), str(args.chunk_size), str(args.workers)]
+		subprocess.run(cmd, env=env, check=True)
+		with open(os.path.join(workdir, 'result.json'), encoding='utf-8') as f:
+			result = json.load(f)
+	calls = dict(server.calls)
+	total_calls = sum(calls.values())
+	result.update({
+		'tickets': n,
+		'tickets_per_sec': n / result['elapsed'] if result['elapsed'] else 0.0,
+		'llm_calls': calls,
+		'llm_calls_per_ticket': total_calls / n if n else 0.0,
+	})
+	return result
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark agent.main on synthetic tickets')
+	parser.add_argument('--sizes', default='1000,10000,100000', help='comma-separated ticket counts')
+	parser.add_argument('--categories', type=int, default=20)
+	parser.add_argument('--duplicate-rate', type=float, default=0.3)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--latency', type=float, default=0.0, help='stub LLM latency per call, seconds')
+	parser.add_argument('--embedder', default='hashing', help="EMBEDDING_MODEL for the run ('hashing' needs no download)")
+	parser.add_argument('--chunk-size', type=int, default=5000)
+	parser.add_argument('--workers', type=int, default=1)
+	parser.add_argument('--json', help='also write the results to this file')
+	args = parser.parse_args()
+
+	server = StubLLMServer(latency=args.latency).start()
+	results = []
+	try:
+		for n in [int(s) for s in args.sizes.split(',') if s]:
+			print(f"Running {n} tickets...", flush=True)
+			results.append(run_size(n, args, server))
+	finally:
+		server.stop()
+
+	print(f"{'tickets':>8} {'tickets/s':>10} {'llm/ticket':>10} {'embed s':>8} {'io s':>8} {'total s':>8} {'rss MB':>8}")
+	for r in results:
+		print(f"{r['tickets']:>8} {r['tickets_per_sec']:>10.1f} {r['llm_calls_per_ticket']:>10.4f} "
+			f"{r['embedding_time']:>8.2f} {r['io_time']:>8.2f} {r['elapsed']:>8.2f} {r['peak_rss_mb']:>8.1f}")
+	if args.json:
+		with open(args.json, 'w', encoding='utf-8') as f:
+			json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+	if len(sys.argv) > 1 and sys.argv[1] == '--child':
+		workdir, input_file, output_file, chunk_size, workers = sys.argv[2:7]
+		_child(workdir, input_file, output_file, int(chunk_size), int(workers))
+	else:
+		main()
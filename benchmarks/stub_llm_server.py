@@ -0,0 +1,121 @@
+# stub_llm_server.py: Local OpenAI-compatible chat endpoint with deterministic answers for benchmarks
+import argparse
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from synthetic_tickets import TOPICS, SYSTEMS
+
+_CATEGORY_PAIR = re.compile(r"Category A: (.*?), Tickets: .*\| Category B: (.*?), Tickets:")
+
+
+def classify_prompt(prompt):
+	"""Return which agent prompt this is: 'naming', 'merge', 'threshold' or 'other'."""
+	if 'Should these be merged' in prompt:
+		return 'merge'
+	if 'INCREASE / DECREASE / KEEP' in prompt:
+		return 'threshold'
+	if 'categorize IT incident tickets' in prompt:
+		return 'naming'
+	return 'other'
+
+def answer(prompt):
+	"""Deterministic reply for the naming, merge and threshold prompts."""
+	kind = classify_prompt(prompt)
+	if kind == 'naming':
+		system = next((s for s in SYSTEMS if s in prompt), None)
+		topic = next((name for name, message in TOPICS if message in prompt), None)
+		if system and topic:
+			return f"{system} {topic}"
+		return topic or 'Uncategorized'
+	if kind == 'merge':
+		match = _CATEGORY_PAIR.search(prompt)
+		if not match:
+			return 'NO'
+		# Merge categories about the same topic, whichever system they were named after
+		topics_a = {name for name, _ in TOPICS if name in match.group(1)}
+		topics_b = {name for name, _ in TOPICS if name in match.group(2)}
+		return 'YES' if topics_a & topics_b else 'NO'
+	if kind == 'threshold':
+		return 'KEEP'
+	return 'OK'
+
+
+class StubLLMServer:
+	"""Threaded stub server. Counts requests per prompt type and sleeps `latency` seconds per call."""
+
+	def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+		self.latency = latency
+		self.calls = Counter()
+		self._lock = threading.Lock()
+		server = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def log_message(self, *args):
+				pass
+
+			def _send(self, status, payload):
+				body = json.dumps(payload).encode('utf-8')
+				self.send_response(status)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def do_GET(self):
+				if self.path.rstrip('/').endswith('/stats'):
+					with server._lock:
+						self._send(200, dict(server.calls))
+				else:
+					self._send(404, {'error': 'not found'})
+
+			def do_POST(self):
+				if not self.path.rstrip('/').endswith('/chat/completions'):
+					self._send(404, {'error': 'not found'})
+					return
+				data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+				prompt = data['messages'][-1]['content']
+				with server._lock:
+					server.calls[classify_prompt(prompt)] += 1
+				if server.latency:
+					time.sleep(server.latency)
+				self._send(200, {
+					'id': 'stub',
+					'object': 'chat.completion',
+					'model': data.get('model', 'stub'),
+					'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer(prompt)}, 'finish_reason': 'stop'}],
+				})
+
+		self._httpd = ThreadingHTTPServer((host, port), Handler)
+		self._thread = None
+
+	@property
+	def api_base(self):
+		host, port = self._httpd.server_address[:2]
+		return f"http://{host}:{port}/v1"
+
+	def start(self):
+		self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._httpd.shutdown()
+		self._httpd.server_close()
+
+	def reset(self):
+		with self._lock:
+			self.calls.clear()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Run a stub OpenAI-compatible LLM server')
+	parser.add_argument('--port', type=int, default=8089)
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds to sleep per request')
+	args = parser.parse_args()
+	server = StubLLMServer(port=args.port, latency=args.latency)
+	print(f"Stub LLM server on {server.api_base} (set OPENROUTER_API_BASE to this)")
+	server._httpd.serve_forever()
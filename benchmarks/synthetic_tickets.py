@@ -0,0 +1,84 @@
+# synthetic_tickets.py: Seeded generator of alert-style incident tickets for benchmarks
+import argparse
+import random
+import pandas as pd
+
+# (short name, alert message) pairs; a category is one topic raised by one source system
+TOPICS = [
+	('Connection Timeout', 'Connection timeout error - unable to establish connection to remote system'),
+	('Queue Depth', 'Queue depth threshold exceeded on inbound message queue'),
+	('Disk Space', 'Disk space usage above 90 percent on application volume'),
+	('SSL Certificate', 'SSL certificate expiring within 7 days for service endpoint'),
+	('Job Failure', 'Scheduled batch job failed with non-zero exit code'),
+	('High CPU', 'CPU utilization above 95 percent for sustained period'),
+	('Memory Leak', 'Heap memory usage growing steadily without release'),
+	('File Transfer', 'File transfer failed - destination path not reachable'),
+	('Authentication', 'Authentication failure - invalid credentials for service account'),
+	('Database Lock', 'Database lock wait timeout exceeded on transaction table'),
+	('API Latency', 'API response latency above 5 seconds for partner endpoint'),
+	('Backup Failure', 'Nightly backup did not complete within maintenance window'),
+]
+SYSTEMS = ['DATA_PROC', 'B2B', 'MQ_FTE', 'SAP_PI', 'ETL', 'PAYMENTS', 'CRM', 'EDI', 'BILLING', 'HR_SYNC']
+NOISE = ['prod', 'eu-west', 'us-east', 'node-3', 'cluster-a', 'retry', 'after deploy', 'weekend', 'peak load']
+
+
+def category_specs(n_categories):
+	"""Return n_categories (system, topic name, message) triples.
+
+	Every topic is used once before any topic repeats with another system, so
+	categories differ in their alert message and not only in the system code.
+	"""
+	specs = [(system, name, message) for system in SYSTEMS for name, message in TOPICS]
+	if n_categories > len(specs):
+		raise ValueError(f"At most {len(specs)} synthetic categories are available")
+	return specs[:n_categories]
+
+def generate_tickets(n, n_categories=20, duplicate_rate=0.3, seed=0):
+	"""Generate n tickets spread over n_categories.
+
+	duplicate_rate is the probability that a ticket repeats the exact text of an
+	earlier ticket (as DATA_PROC-style alerts do), with a fresh incident ID.
+	Returns a DataFrame with the columns the agent expects from the real export.
+	"""
+	rng = random.Random(seed)
+	specs = category_specs(n_categories)
+	rows = []
+	texts = []
+	for i in range(n):
+		system, name, message = specs[rng.randrange(len(specs))]
+		if texts and rng.random() < duplicate_rate:
+			summary, truth = texts[rng.randrange(len(texts))]
+		else:
+			code = f"{system}.I{rng.randrange(1000, 9999)}"
+			summary = f"{code} query result is > 0.0 for {rng.randrange(1, 120)} minutes on '{message}' ({rng.choice(NOISE)})"
+			truth = f"{system} {name}"
+			texts.append((summary, truth))
+		rows.append({
+			'Incident ID*+': f"INC{seed:02d}{i:010d}",
+			'Summary*': summary,
+			'Service*+': f"{system} Services",
+			'Priority*': rng.choice(['Low', 'Medium', 'High', 'Critical']),
+			'Status*': rng.choice(['Assigned', 'In Progress', 'Closed']),
+			'Expected Category': truth,
+		})
+	return pd.DataFrame(rows)
+
+def write_tickets(df, path):
+	if path.endswith('.csv'):
+		df.to_csv(path, index=False)
+	elif path.endswith('.jsonl'):
+		df.to_json(path, orient='records', lines=True)
+	else:
+		df.to_excel(path, index=False)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Generate synthetic incident tickets')
+	parser.add_argument('output', help='output file (.csv, .jsonl or .xlsx)')
+	parser.add_argument('-n', type=int, default=1000, help='number of tickets')
+	parser.add_argument('--categories', type=int, default=20)
+	parser.add_argument('--duplicate-rate', type=float, default=0.3)
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+	write_tickets(generate_tickets(args.n, args.categories, args.duplicate_rate, args.seed), args.output)
+	print(f"Wrote {args.n} tickets to {args.output}")
@@ -0,0 +1,134 @@
+# cache.py: Small persistent key/value cache backed by SQLite
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# Seconds a connection waits for another process's write lock before raising 'database is locked'
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '30'))
+
+
+def content_hash(*parts):
+	"""Return a stable sha256 hex digest for the given string parts."""
+	h = hashlib.sha256()
+	for part in parts:
+		h.update(str(part).encode('utf-8'))
+		h.update(b'\x00')
+	return h.hexdigest()
+
+
+class SQLiteCache:
+	"""Persistent blob cache keyed by content hash with size-bounded LRU eviction.
+
+	Entries are evicted least-recently-used first once the table holds more
+	than max_entries rows. If ttl (seconds) is set, entries older than that
+	are treated as misses and purged on the next eviction. Safe to share
+	between threads, and between processes (such as shard workers) that open
+	the same file.
+	"""
+
+	def __init__(self, path, max_entries=100000, table='cache', ttl=None):
+		self.path = path
+		self.max_entries = max_entries
+		self.ttl = ttl or None
+		self.table = table
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+		self._writes_since_evict = 0
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+		self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+		self._conn.execute(f'PRAGMA busy_timeout={int(SQLITE_BUSY_TIMEOUT * 1000)}')
+		self._conn.execute('PRAGMA journal_mode=WAL')
+		self._conn.execute('PRAGMA synchronous=NORMAL')
+		self._conn.execute(
+			f'CREATE TABLE IF NOT EXISTS {table} ('
+			'key TEXT PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL, created REAL NOT NULL DEFAULT 0)'
+		)
+		columns = [row[1] for row in self._conn.execute(f'PRAGMA table_info({table})')]
+		if 'created' not in columns:
+			self._conn.execute(f'ALTER TABLE {table} ADD COLUMN created REAL NOT NULL DEFAULT 0')
+		self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table}(last_used)')
+		self._conn.commit()
+
+	def get_many(self, keys):
+		"""Return a dict of key -> value for the keys present in the cache."""
+		found = {}
+		keys = list(dict.fromkeys(keys))
+		if not keys:
+			return found
+		now = time.time()
+		oldest = now - self.ttl if self.ttl else 0
+		with self._lock:
+			# SQLite limits the number of bound parameters per statement
+			for start in range(0, len(keys), 500):
+				chunk = keys[start:start + 500]
+				marks = ','.join('?' * len(chunk))
+				rows = self._conn.execute(
+					f'SELECT key, value FROM {self.table} WHERE key IN ({marks}) AND created >= ?', chunk + [oldest]
+				).fetchall()
+				found.update(rows)
+			if found:
+				self._conn.executemany(
+					f'UPDATE {self.table} SET last_used = ? WHERE key = ?',
+					[(now, key) for key in found]
+				)
+				self._conn.commit()
+			self.hits += len(found)
+			self.misses += len(keys) - len(found)
+		return found
+
+	def get(self, key):
+		return self.get_many([key]).get(key)
+
+	def put_many(self, items):
+		"""Store (key, value) pairs and evict old entries if over capacity."""
+		items = list(items)
+		if not items:
+			return
+		now = time.time()
+		with self._lock:
+			self._conn.executemany(
+				f'INSERT OR REPLACE INTO {self.table} (key, value, last_used, created) VALUES (?, ?, ?, ?)',
+				[(key, value, now, now) for key, value in items]
+			)
+			self._writes_since_evict += len(items)
+			# Counting rows is not free, so only check capacity every so often
+			if self._writes_since_evict >= max(1, self.max_entries // 100):
+				self._evict()
+			self._conn.commit()
+
+	def put(self, key, value):
+		self.put_many([(key, value)])
+
+	def _evict(self):
+		self._writes_since_evict = 0
+		if self.ttl:
+			self._conn.execute(f'DELETE FROM {self.table} WHERE created < ?', (time.time() - self.ttl,))
+		count = self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+		excess = count - self.max_entries
+		if excess > 0:
+			self._conn.execute(
+				f'DELETE FROM {self.table} WHERE key IN '
+				f'(SELECT key FROM {self.table} ORDER BY last_used ASC LIMIT ?)',
+				(excess,)
+			)
+
+	def stats(self):
+		return {'hits': self.hits, 'misses': self.misses}
+
+	def clear(self):
+		with self._lock:
+			self._conn.execute(f'DELETE FROM {self.table}')
+			self._conn.commit()
+
+	def __len__(self):
+		with self._lock:
+			return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+	def close(self):
+		with self._lock:
+			self._conn.close()
@@ -1,67 +1,281 @@
 last_category_reason = None
 # categorization.py: assign/create/merge/rename category logic
-import pandas as pd
+import os
+import random
 import numpy as np
+from clustering import leader_clusters, representatives, CLUSTER_REPRESENTATIVES
+from metrics import get_logger, span, incr
 
-def load_tickets(file_path):
-	"""Load tickets from Excel file. Returns a pandas DataFrame."""
-	print(f"[load_tickets] Loading tickets from: {file_path}")
-	df = pd.read_excel(file_path)
-	print(f"[load_tickets] Loaded {len(df)} tickets. Columns: {df.columns}")
-	return df
+log = get_logger(__name__)
 
-def assign_ticket_to_category(ticket, memory, threshold, get_embedding):
-	"""Assign ticket to best matching category if similarity > threshold. Returns category name or None."""
-	print(f"[assign_ticket_to_category] Ticket: {ticket}")
+# Examples kept per category: a uniform reservoir sample of all its tickets
+CATEGORY_MAX_EXAMPLES = int(os.getenv('CATEGORY_MAX_EXAMPLES', '50'))
+# Tickets closest to the centroid kept per category as 'medoids' (approximate; 0 = off)
+CATEGORY_MEDOIDS = int(os.getenv('CATEGORY_MEDOIDS', '3'))
+
+# Seeded so repeated runs over the same input keep the same examples
+_reservoir_rng = random.Random(0)
+
+def assign_ticket_to_category(ticket, memory, threshold, get_embedding, index=None, controller=None, exemplars=None, k=1):
+	"""Assign ticket to best matching category if similarity > threshold. Returns category name or None.
+
+	If a CategoryIndex is given, all categories are scored with one matrix multiply
+	instead of looping over memory['categories']. If an ExemplarIndex is given, the
+	category is instead chosen by a vote of the k nearest stored exemplars. If a
+	ThresholdController is given, the best-match similarity and outcome are
+	recorded in it.
+	"""
+	log.debug("Ticket: %s", ticket)
 	ticket_emb = get_embedding(ticket)
-	best_cat = None
-	best_sim = -1
-	for cat, cat_data in memory.get('categories', {}).items():
-		cat_emb = cat_data['embedding']
-		sim = cosine_similarity(ticket_emb, cat_emb)
-		print(f"[assign_ticket_to_category] Category: {cat}, Similarity: {sim}")
-		if sim > best_sim:
-			best_sim = sim
-			best_cat = cat
-	print(f"[assign_ticket_to_category] Best category: {best_cat}, Best similarity: {best_sim}, Threshold: {threshold}")
-	if best_sim >= threshold:
-		return best_cat
-	return None
+	if exemplars is not None:
+		assigned, score, best_sim = exemplars.vote(ticket_emb, threshold, k)
+		log.debug("kNN vote: %s (score %s, nearest %s), Threshold: %s", assigned, score, best_sim, threshold)
+		if controller is not None and best_sim is not None:
+			controller.observe(best_sim, assigned)
+		return assigned
+	if index is not None:
+		with span('similarity.search'):
+			top = index.search(ticket_emb, k=1)
+		best_cat, best_sim = top[0] if top else (None, -1)
+	else:
+		best_cat = None
+		best_sim = -1
+		for cat, cat_data in memory.get('categories', {}).items():
+			cat_emb = cat_data['embedding']
+			sim = cosine_similarity(ticket_emb, cat_emb)
+			log.debug("Category: %s, Similarity: %s", cat, sim)
+			if sim > best_sim:
+				best_sim = sim
+				best_cat = cat
+	log.debug("Best category: %s, Best similarity: %s, Threshold: %s", best_cat, best_sim, threshold)
+	assigned = best_cat if best_sim >= threshold else None
+	if controller is not None and best_cat is not None:
+		controller.observe(best_sim, assigned)
+	return assigned
+
+def assign_tickets_batch(tickets, threshold, get_embeddings, index, k=1, controller=None, exemplars=None):
+	"""Score a batch of tickets against the index in one pass.
+
+	Returns (embeddings, matches) where matches[i] is a list of up to k
+	(category, score) pairs for ticket i and the first entry is the assigned
+	category, or an empty list when no category reaches the threshold.
+	With an ExemplarIndex, matches[i] is the single kNN-vote winner instead.
+	Best-match similarities are recorded in controller, if given.
+	"""
+	embeddings = get_embeddings(tickets)
+	matches = []
+	if exemplars is not None:
+		for emb in embeddings:
+			assigned, score, best_sim = exemplars.vote(emb, threshold, k)
+			matches.append([(assigned, score)] if assigned is not None else [])
+			if controller is not None and best_sim is not None:
+				controller.observe(best_sim, assigned)
+		return embeddings, matches
+	with span('similarity.search'):
+		tops = index.search_batch(embeddings, k=k)
+	for top in tops:
+		matches.append(top if top and top[0][1] >= threshold else [])
+		if controller is not None and top:
+			controller.observe(top[0][1], matches[-1][0][0] if matches[-1] else None)
+	log.debug("Scored %s tickets against %s categories.", len(tickets), len(index))
+	return embeddings, matches
 
 def create_category(ticket, memory, get_embedding, llm_suggest_name):
 	"""Create a new category for the ticket. Returns new category name."""
-	print(f"[create_category] Creating category for ticket: {ticket}")
+	log.debug("Creating category for ticket: %s", ticket)
 	ticket_emb = get_embedding(ticket)
 	# Use LLM to suggest a category name and reason
 	llm_response = llm_suggest_name([ticket])
-	print(f"[create_category] LLM response: {llm_response}")
+	log.debug("LLM response: %s", llm_response)
 	# Do not parse here; return raw response for agent.py to handle
 	return llm_response, ticket_emb
 
-def merge_categories(cat_a, cat_b, memory):
-	"""Merge cat_b into cat_a, update examples and embedding."""
-	print(f"[merge_categories] Merging '{cat_b}' into '{cat_a}'")
+def create_categories_batch(tickets, embeddings, threshold, llm_suggest_names, n_representatives=CLUSTER_REPRESENTATIVES):
+	"""Cluster unmatched tickets locally and name each cluster with one LLM call.
+
+	embeddings are the tickets' normalized embeddings. Returns one
+	(llm_response, centroid, members) triple per cluster, where members are
+	indices into tickets; as with create_category the response is not parsed.
+	"""
+	clusters, centroids = leader_clusters(embeddings, threshold)
+	groups = [
+		[tickets[i] for i in representatives(embeddings, members, centroid, n_representatives)]
+		for members, centroid in zip(clusters, centroids)
+	]
+	log.debug("%s unmatched tickets -> %s clusters to name", len(tickets), len(groups))
+	responses = llm_suggest_names(groups) if groups else []
+	return list(zip(responses, centroids, clusters))
+
+def category_count(cat):
+	"""Tickets assigned to a category; memories written before counts were stored fall back to the examples."""
+	return cat.get('count', len(cat.get('examples', [])))
+
+def category_exemplars(cat, n):
+	"""Up to n example texts for prompts: medoids first, then reservoir examples."""
+	texts = [text for _, text in cat.get('medoids', [])]
+	texts += [text for text in cat.get('examples', []) if text not in texts]
+	return texts[:n]
+
+def _reservoir_add(examples, count, item, cap=CATEGORY_MAX_EXAMPLES):
+	"""Add the count-th item (1-based) of a stream to a reservoir of at most cap examples (in place)."""
+	if len(examples) > cap:
+		examples[:] = _reservoir_rng.sample(examples, cap)
+	if len(examples) < cap:
+		examples.append(item)
+	else:
+		j = _reservoir_rng.randrange(count)
+		if j < cap:
+			examples[j] = item
+
+def _reservoir_merge(examples_a, n_a, examples_b, n_b, cap=CATEGORY_MAX_EXAMPLES):
+	"""Combine two reservoirs over n_a and n_b tickets into one sample of at most cap examples.
+
+	Each slot is one ticket drawn without replacement from the n_a + n_b tickets
+	(so the split between a and b is hypergeometric, as for a uniform sample of
+	the combined stream), represented by a random unused example from its side.
+	"""
+	pool_a = list(examples_a)
+	pool_b = list(examples_b)
+	if len(pool_a) + len(pool_b) <= cap:
+		return pool_a + pool_b
+	weight_a = max(n_a, len(pool_a))
+	weight_b = max(n_b, len(pool_b))
+	merged = []
+	while len(merged) < cap and (pool_a or pool_b):
+		use_a = bool(pool_a) and (not pool_b or _reservoir_rng.randrange(weight_a + weight_b) < weight_a)
+		pool = pool_a if use_a else pool_b
+		merged.append(pool.pop(_reservoir_rng.randrange(len(pool))))
+		if use_a:
+			weight_a -= 1
+		else:
+			weight_b -= 1
+	return merged
+
+def _update_medoids(cat, text, embedding, centroid, cap=CATEGORY_MEDOIDS):
+	"""Keep the cap texts most similar to the centroid at the time they were added."""
+	if cap <= 0:
+		return
+	medoids = [m for m in cat.get('medoids', []) if m[1] != text]
+	norm = np.linalg.norm(embedding) * np.linalg.norm(centroid)
+	score = float(np.dot(embedding, centroid) / norm) if norm > 0 else 0.0
+	medoids.append([score, text])
+	medoids.sort(key=lambda m: -m[0])
+	cat['medoids'] = medoids[:cap]
+
+def add_to_category(name, text, embedding, memory, index=None):
+	"""Add one ticket to an existing category.
+
+	The centroid becomes the running mean of its tickets' embeddings, the count
+	is incremented and text is offered to the example reservoir and medoids.
+	"""
+	cat = memory['categories'][name]
+	count = category_count(cat) + 1
+	emb = np.asarray(embedding, dtype=np.float32)
+	old = np.asarray(cat['embedding'], dtype=np.float32)
+	centroid = old + (emb - old) / count
+	cat['embedding'] = centroid.tolist()
+	cat['count'] = count
+	examples = list(cat.get('examples', []))
+	_reservoir_add(examples, count, text)
+	cat['examples'] = examples
+	_update_medoids(cat, text, emb, centroid)
+	if index is not None:
+		index.update(name, cat['embedding'])
+
+def add_category(name, examples, embedding, memory, index=None, count=None):
+	"""Add a category, or fold examples/embedding into it if name already exists.
+
+	embedding is the mean embedding of the count tickets (default
+	len(examples)) being added; an existing centroid is combined with it
+	weighted by both counts. A name that was merged or renamed away is folded
+	into the category it now resolves to (see resolve_category), so callers
+	should resolve the name themselves before using it further. Returns True if
+	a new category was created.
+	"""
+	name = resolve_category(name, memory)
+	categories = memory.setdefault('categories', {})
+	count = len(examples) if count is None else count
+	embedding = np.asarray(embedding, dtype=np.float32)
+	if name not in categories:
+		cat = categories[name] = {'examples': [], 'embedding': embedding.tolist(), 'count': count}
+		cat['examples'] = _reservoir_merge([], 0, examples, count)
+		if count == 1 and examples:
+			# A single ticket is its own medoid; larger groups gain medoids as tickets are added
+			_update_medoids(cat, examples[0], embedding, embedding)
+		if index is not None:
+			index.add(name, cat['embedding'])
+		return True
+	cat = categories[name]
+	n_a = category_count(cat)
+	total = max(n_a + count, 1)
+	emb_a = np.asarray(cat['embedding'], dtype=np.float32)
+	cat['embedding'] = ((emb_a * n_a + embedding * count) / total).tolist()
+	cat['count'] = n_a + count
+	cat['examples'] = _reservoir_merge(cat.get('examples', []), n_a, examples, count)
+	if index is not None:
+		index.update(name, cat['embedding'])
+	return False
+
+def parse_category_name(llm_response):
+	"""Take the category name from a naming response; unsure answers become 'Uncategorized'."""
+	lines = llm_response.strip().splitlines()
+	cat_name = lines[0].strip() if lines else ''
+	if not cat_name or 'uncategorized' in cat_name.lower():
+		log.debug("LLM could not suggest a category. Assigning default: Uncategorized")
+		return 'Uncategorized'
+	return cat_name
+
+def merge_categories(cat_a, cat_b, memory, index=None):
+	"""Merge cat_b into cat_a, update examples and embedding (and the index, if given)."""
+	log.info("Merging '%s' into '%s'", cat_b, cat_a)
 	if cat_a not in memory['categories'] or cat_b not in memory['categories']:
-		print(f"[merge_categories] One or both categories not found.")
+		log.warning("One or both categories not found.")
 		return
-	memory['categories'][cat_a]['examples'] += memory['categories'][cat_b]['examples']
-	# Average embeddings
-	emb_a = np.array(memory['categories'][cat_a]['embedding'])
-	emb_b = np.array(memory['categories'][cat_b]['embedding'])
-	n_a = len(memory['categories'][cat_a]['examples'])
-	n_b = len(memory['categories'][cat_b]['examples'])
-	memory['categories'][cat_a]['embedding'] = ((emb_a*n_a + emb_b*n_b)/(n_a+n_b)).tolist()
+	a = memory['categories'][cat_a]
+	b = memory['categories'][cat_b]
+	# Weight the centroids by ticket counts taken before the examples are combined
+	n_a = category_count(a)
+	n_b = category_count(b)
+	emb_a = np.asarray(a['embedding'], dtype=np.float32)
+	emb_b = np.asarray(b['embedding'], dtype=np.float32)
+	a['embedding'] = ((emb_a*n_a + emb_b*n_b)/max(n_a+n_b, 1)).tolist()
+	a['count'] = n_a + n_b
+	a['examples'] = _reservoir_merge(a.get('examples', []), n_a, b.get('examples', []), n_b)
+	if CATEGORY_MEDOIDS > 0:
+		# Medoid scores are relative to the old centroids, so the combined ranking is approximate
+		medoids = sorted(a.get('medoids', []) + b.get('medoids', []), key=lambda m: -m[0])
+		a['medoids'] = medoids[:CATEGORY_MEDOIDS]
 	del memory['categories'][cat_b]
-	print(f"[merge_categories] Merge complete. Remaining categories: {list(memory['categories'].keys())}")
+	# Tickets already labelled cat_b are resolved to cat_a when output is written
+	memory.setdefault('aliases', {})[cat_b] = cat_a
+	if index is not None:
+		index.remove(cat_b)
+		index.update(cat_a, memory['categories'][cat_a]['embedding'])
+	incr('categories.merged')
+	log.debug("Merge complete. %s categories remain.", len(memory['categories']))
 
-def rename_category(cat, new_name, memory):
-	"""Rename a category in memory."""
-	print(f"[rename_category] Renaming '{cat}' to '{new_name}'")
+def rename_category(cat, new_name, memory, index=None):
+	"""Rename a category in memory (and the index, if given)."""
+	log.info("Renaming '%s' to '%s'", cat, new_name)
 	if cat not in memory['categories']:
-		print(f"[rename_category] Category '{cat}' not found.")
+		log.warning("Category '%s' not found.", cat)
 		return
 	memory['categories'][new_name] = memory['categories'].pop(cat)
-	print(f"[rename_category] Rename complete. Categories: {list(memory['categories'].keys())}")
+	memory.setdefault('aliases', {})[cat] = new_name
+	memory['aliases'].pop(new_name, None)
+	if index is not None:
+		index.rename(cat, new_name)
+	incr('categories.renamed')
+	log.debug("Rename complete.")
+
+def resolve_category(name, memory):
+	"""Follow merge/rename aliases to the category's current name."""
+	aliases = memory.get('aliases', {})
+	seen = set()
+	while name in aliases and name not in seen:
+		seen.add(name)
+		name = aliases[name]
+	return name
 
 def cosine_similarity(a, b):
 	a = np.array(a)
@@ -0,0 +1,134 @@
+# category_index.py: In-memory matrix of normalized category centroids for fast similarity search
+import numpy as np
+
+
+class CategoryIndex:
+	"""Keeps one L2-normalized centroid per category in a contiguous float32 matrix.
+
+	Rows are addressed by category name. Additions grow the matrix geometrically,
+	removals swap the last row into the freed slot, so create/merge/rename are
+	O(dim) and never require a full rebuild. Scoring a ticket (or a batch of
+	tickets) is a single matrix multiply against the live rows.
+	"""
+
+	def __init__(self, dim=None, capacity=64):
+		self.dim = dim
+		self._capacity = capacity
+		self._matrix = None if dim is None else np.zeros((capacity, dim), dtype=np.float32)
+		self._names = []
+		self._rows = {}
+		# Bumped whenever a category's centroid changes; used to detect stale cached decisions
+		self.versions = {}
+
+	@classmethod
+	def from_memory(cls, memory):
+		"""Build an index from the 'categories' section of a memory dict."""
+		index = cls()
+		for name, data in memory.get('categories', {}).items():
+			index.add(name, data['embedding'])
+		return index
+
+	def __len__(self):
+		return len(self._names)
+
+	def __contains__(self, name):
+		return name in self._rows
+
+	@property
+	def names(self):
+		return list(self._names)
+
+	@property
+	def matrix(self):
+		"""View of the live (n, dim) centroid rows."""
+		if self._matrix is None:
+			return np.zeros((0, self.dim or 0), dtype=np.float32)
+		return self._matrix[:len(self._names)]
+
+	def get(self, name):
+		"""Return a copy of the normalized centroid for name."""
+		return self._matrix[self._rows[name]].copy()
+
+	def _normalize(self, embedding):
+		vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+		norm = np.linalg.norm(vec)
+		return vec / norm if norm > 0 else vec
+
+	def _ensure_capacity(self, size):
+		if self._matrix is None:
+			self._matrix = np.zeros((max(self._capacity, size), self.dim), dtype=np.float32)
+		elif size > self._matrix.shape[0]:
+			grown = np.zeros((max(size, self._matrix.shape[0] * 2), self.dim), dtype=np.float32)
+			grown[:len(self._names)] = self._matrix[:len(self._names)]
+			self._matrix = grown
+
+	def add(self, name, embedding):
+		"""Add a category, or replace its centroid if it already exists."""
+		vec = self._normalize(embedding)
+		if self.dim is None:
+			self.dim = vec.shape[0]
+		if name in self._rows:
+			self._matrix[self._rows[name]] = vec
+		else:
+			self._ensure_capacity(len(self._names) + 1)
+			self._rows[name] = len(self._names)
+			self._names.append(name)
+			self._matrix[self._rows[name]] = vec
+		self.versions[name] = self.versions.get(name, 0) + 1
+
+	update = add
+
+	def remove(self, name):
+		"""Remove a category by swapping the last row into its slot."""
+		row = self._rows.pop(name, None)
+		if row is None:
+			return
+		last = len(self._names) - 1
+		if row != last:
+			moved = self._names[last]
+			self._matrix[row] = self._matrix[last]
+			self._names[row] = moved
+			self._rows[moved] = row
+		self._names.pop()
+		self.versions.pop(name, None)
+
+	def rename(self, old_name, new_name):
+		"""Rename a category in place; the centroid row is unchanged."""
+		if old_name not in self._rows or old_name == new_name:
+			return
+		if new_name in self._rows:
+			self.remove(new_name)
+		row = self._rows.pop(old_name)
+		self._rows[new_name] = row
+		self._names[row] = new_name
+		self.versions[new_name] = self.versions.pop(old_name, 0) + 1
+
+	def scores(self, embeddings):
+		"""Return an (m, n) matrix of cosine similarities for m query embeddings."""
+		queries = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+		if not self._names:
+			return np.zeros((queries.shape[0], 0), dtype=np.float32)
+		norms = np.linalg.norm(queries, axis=1, keepdims=True)
+		norms[norms == 0] = 1.0
+		return (queries / norms) @ self.matrix.T
+
+	def search_batch(self, embeddings, k=1):
+		"""Return top-k (name, score) lists for each query embedding, best first."""
+		sims = self.scores(embeddings)
+		n = sims.shape[1]
+		if n == 0:
+			return [[] for _ in range(sims.shape[0])]
+		k = min(k, n)
+		if k < n:
+			top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+		else:
+			top = np.tile(np.arange(n), (sims.shape[0], 1))
+		results = []
+		for row, cols in zip(sims, top):
+			cols = cols[np.argsort(-row[cols])]
+			results.append([(self._names[c], float(row[c])) for c in cols])
+		return results
+
+	def search(self, embedding, k=1):
+		"""Return the top-k (name, score) pairs for a single embedding."""
+		return self.search_batch(embedding, k)[0]
@@ -0,0 +1,72 @@
+# checkpoint.py: Append-only results log so long runs can be checkpointed and resumed
+import json
+import os
+import time
+from metrics import get_logger
+
+log = get_logger(__name__)
+
+# Flush the buffered results after this many records or this many seconds, whichever comes first
+CHECKPOINT_EVERY = int(os.getenv('CHECKPOINT_EVERY', '100'))
+CHECKPOINT_INTERVAL = float(os.getenv('CHECKPOINT_INTERVAL', '30'))
+
+
+class ResultsLog:
+	"""Per-ticket category assignments buffered in memory and appended to a JSONL file.
+
+	Each line is {"key": <ticket key>, "category": <name>}. Later lines win, so
+	re-recording a ticket (e.g. after a merge relabels it) is just another append.
+	"""
+
+	def __init__(self, path, flush_every=CHECKPOINT_EVERY, flush_interval=CHECKPOINT_INTERVAL):
+		self.path = path
+		self.flush_every = flush_every
+		self.flush_interval = flush_interval
+		self._buffer = []
+		self._last_flush = time.monotonic()
+		directory = os.path.dirname(path)
+		if directory:
+			os.makedirs(directory, exist_ok=True)
+
+	def load(self):
+		"""Return {key: category} for every ticket recorded so far."""
+		results = {}
+		if not os.path.exists(self.path):
+			return results
+		with open(self.path, 'r', encoding='utf-8') as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except json.JSONDecodeError:
+					# A torn final line from an interrupted write
+					log.warning("Ignoring corrupt line in %s", self.path)
+					break
+				results[record['key']] = record['category']
+		log.info("Loaded %s recorded tickets from %s", len(results), self.path)
+		return results
+
+	def reset(self):
+		"""Start a fresh log, discarding any previous results."""
+		self._buffer = []
+		open(self.path, 'w', encoding='utf-8').close()
+
+	def record(self, key, category):
+		self._buffer.append({'key': key, 'category': category})
+
+	def due(self):
+		"""True when enough records or time have accumulated to warrant a flush."""
+		if not self._buffer:
+			return False
+		return len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval
+
+	def flush(self):
+		"""Append buffered records to disk and fsync them."""
+		self._last_flush = time.monotonic()
+		if not self._buffer:
+			return
+		with open(self.path, 'a', encoding='utf-8') as f:
+			f.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in self._buffer))
+			f.flush()
+			os.fsync(f.fileno())
+		log.debug("Checkpointed %s results", len(self._buffer))
+		self._buffer = []
@@ -0,0 +1,54 @@
+# clustering.py: Local clustering of unmatched tickets so new categories are named once per cluster
+import os
+import numpy as np
+from metrics import get_logger, span
+
+log = get_logger(__name__)
+
+# Buffer tickets that match no category and name them per cluster instead of per ticket
+CLUSTER_NEW_TICKETS = os.getenv('CLUSTER_NEW_TICKETS', '').lower() in ('1', 'true', 'yes')
+# Unmatched tickets buffered before a clustering pass (the buffer is also flushed at the end of each chunk)
+CLUSTER_BUFFER_SIZE = int(os.getenv('CLUSTER_BUFFER_SIZE', '256'))
+# Similarity for joining a cluster; empty = the assignment threshold
+CLUSTER_THRESHOLD = os.getenv('CLUSTER_THRESHOLD', '')
+# Tickets per cluster shown to the LLM when naming it
+CLUSTER_REPRESENTATIVES = int(os.getenv('CLUSTER_REPRESENTATIVES', '3'))
+
+
+def leader_clusters(embeddings, threshold):
+	"""Single-pass leader clustering of L2-normalized embeddings.
+
+	Each row joins the cluster whose (running mean) centroid is most similar
+	if that similarity is >= threshold, and otherwise starts a new cluster.
+	Returns (clusters, centroids): a list of row-index lists and the
+	normalized (n_clusters, dim) centroid matrix.
+	"""
+	embeddings = np.asarray(embeddings, dtype=np.float32)
+	n = len(embeddings)
+	if n == 0:
+		return [], np.zeros((0, embeddings.shape[1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+	sums = np.zeros_like(embeddings)
+	centroids = np.zeros_like(embeddings)
+	clusters = []
+	with span('cluster.leader'):
+		for i, emb in enumerate(embeddings):
+			k = len(clusters)
+			if k:
+				scores = centroids[:k] @ emb
+				best = int(np.argmax(scores))
+			if k and scores[best] >= threshold:
+				clusters[best].append(i)
+			else:
+				best = k
+				clusters.append([i])
+			sums[best] += emb
+			norm = np.linalg.norm(sums[best])
+			centroids[best] = sums[best] / norm if norm > 0 else sums[best]
+	log.debug("%s tickets -> %s clusters (threshold %s)", n, len(clusters), threshold)
+	return clusters, centroids[:len(clusters)].copy()
+
+def representatives(embeddings, members, centroid, n=CLUSTER_REPRESENTATIVES):
+	"""Return up to n member row indices closest to the cluster centroid, closest first."""
+	members = np.asarray(members)
+	scores = np.asarray(embeddings, dtype=np.float32)[members] @ centroid
+	return members[np.argsort(-scores, kind='stable')[:n]].tolist()
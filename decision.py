@@ -1,21 +1,186 @@
 # decision.py: Decision engine logic
+import math
+import os
+import numpy as np
+from categorization import category_count
 from llm import llm_adjust_threshold
+from metrics import get_logger, incr
 
-def adjust_threshold(memory, current_threshold):
+log = get_logger(__name__)
+
+# 'local' picks the threshold from observed similarities (ThresholdController), 'llm' asks the LLM, 'off' keeps it fixed
+THRESHOLD_MODE = os.getenv('THRESHOLD_MODE', 'local').lower()
+# Tickets between threshold adjustments
+THRESHOLD_INTERVAL = int(os.getenv('THRESHOLD_INTERVAL', '200'))
+# Observations needed before the local controller moves the threshold (in gap mode: unmatched and assigned each)
+THRESHOLD_MIN_SAMPLES = int(os.getenv('THRESHOLD_MIN_SAMPLES', '100'))
+# If > 0, aim for this fraction of tickets creating a new category instead of using the similarity gap
+THRESHOLD_TARGET_NEW_RATE = float(os.getenv('THRESHOLD_TARGET_NEW_RATE', '0'))
+THRESHOLD_MIN = float(os.getenv('THRESHOLD_MIN', '0.5'))
+THRESHOLD_MAX = float(os.getenv('THRESHOLD_MAX', '0.95'))
+# Largest change applied by one adjustment
+THRESHOLD_MAX_STEP = float(os.getenv('THRESHOLD_MAX_STEP', '0.05'))
+
+
+class _Moments:
+	"""Running count/mean/variance (Welford), mergeable."""
+
+	__slots__ = ('count', 'mean', 'm2')
+
+	def __init__(self):
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0
+
+	def add(self, x):
+		self.count += 1
+		delta = x - self.mean
+		self.mean += delta / self.count
+		self.m2 += delta * (x - self.mean)
+
+	def merge(self, other):
+		count = self.count + other.count
+		if not count:
+			return
+		delta = other.mean - self.mean
+		self.mean += delta * other.count / count
+		self.m2 += other.m2 + delta * delta * self.count * other.count / count
+		self.count = count
+
+	@property
+	def std(self):
+		return math.sqrt(self.m2 / self.count) if self.count > 1 else 0.0
+
+
+class ThresholdController:
+	"""Chooses the assignment threshold from the similarities seen on the assignment path.
+
+	observe() is called once per ticket with its best-match similarity and the
+	category it was assigned to (None if it created a new one) and is O(1): it
+	updates a fixed-bin histogram of best-match similarities, a histogram of
+	the unmatched ones (similarity to the nearest other category, i.e. the
+	inter-category signal) and running cohesion moments per category.
+
+	suggest() then either puts the threshold at the quantile that yields the
+	target new-category rate, or halfway across the gap between inter-category
+	similarity (90th percentile of unmatched best matches) and intra-category
+	cohesion (mean - 1 std of assigned similarities), bounded and rate-limited.
+	"""
+
+	def __init__(self, bins=200, target_new_rate=THRESHOLD_TARGET_NEW_RATE, min_samples=THRESHOLD_MIN_SAMPLES,
+			min_threshold=THRESHOLD_MIN, max_threshold=THRESHOLD_MAX, max_step=THRESHOLD_MAX_STEP):
+		self.bins = bins
+		self.target_new_rate = target_new_rate
+		self.min_samples = min_samples
+		self.min_threshold = min_threshold
+		self.max_threshold = max_threshold
+		self.max_step = max_step
+		# Cosine similarities in [-1, 1]
+		self.best_hist = np.zeros(bins, dtype=np.int64)
+		self.unmatched_hist = np.zeros(bins, dtype=np.int64)
+		self.cohesion = {}
+		self.intra = _Moments()
+
+	def _bin(self, sim):
+		return min(max(int((sim + 1.0) / 2.0 * self.bins), 0), self.bins - 1)
+
+	def _quantile(self, hist, q):
+		total = hist.sum()
+		if not total:
+			return None
+		i = int(np.searchsorted(np.cumsum(hist), q * total))
+		return (min(i, self.bins - 1) + 0.5) / self.bins * 2.0 - 1.0
+
+	def observe(self, best_sim, category=None):
+		"""Record one ticket's best-match similarity and the category it joined (None if unmatched)."""
+		if best_sim is None:
+			return
+		b = self._bin(best_sim)
+		self.best_hist[b] += 1
+		if category is None:
+			self.unmatched_hist[b] += 1
+		else:
+			stats = self.cohesion.get(category)
+			if stats is None:
+				stats = self.cohesion[category] = _Moments()
+			stats.add(best_sim)
+			self.intra.add(best_sim)
+
+	def merge_category(self, cat_a, cat_b):
+		"""Fold cat_b's cohesion statistics into cat_a (after merge_categories)."""
+		stats = self.cohesion.pop(cat_b, None)
+		if stats is not None:
+			self.cohesion.setdefault(cat_a, _Moments()).merge(stats)
+
+	def rename_category(self, cat, new_name):
+		if cat in self.cohesion:
+			self.cohesion[new_name] = self.cohesion.pop(cat)
+
+	@property
+	def samples(self):
+		return int(self.best_hist.sum())
+
+	def new_rate(self):
+		samples = self.samples
+		return self.unmatched_hist.sum() / samples if samples else 0.0
+
+	def target(self):
+		"""Unbounded threshold suggested by the observed distributions, or None if there is too little data."""
+		if self.samples < self.min_samples:
+			return None
+		if self.target_new_rate > 0:
+			return self._quantile(self.best_hist, self.target_new_rate)
+		# Both sides of the gap need their own sample, or one stray unmatched ticket sets the threshold
+		if self.unmatched_hist.sum() < self.min_samples or self.intra.count < self.min_samples:
+			return None
+		inter = self._quantile(self.unmatched_hist, 0.9)
+		intra = self.intra.mean - self.intra.std
+		return (inter + intra) / 2.0
+
+	def suggest(self, current_threshold):
+		target = self.target()
+		if target is None:
+			log.debug("Not enough observations (%s, %s unmatched); keeping threshold %s",
+				self.samples, int(self.unmatched_hist.sum()), current_threshold)
+			return current_threshold
+		step = min(max(target - current_threshold, -self.max_step), self.max_step)
+		new_threshold = min(max(current_threshold + step, self.min_threshold), self.max_threshold)
+		log.debug("Target %.3f from %s observations (new rate %.3f, intra %.3f +/- %.3f)",
+			target, self.samples, self.new_rate(), self.intra.mean, self.intra.std)
+		return round(new_threshold, 4)
+
+
+def adjust_threshold(memory, current_threshold, controller=None, mode=THRESHOLD_MODE):
+	"""Return the next assignment threshold.
+
+	mode 'local' uses the controller's similarity statistics, 'llm' asks the
+	LLM to INCREASE/DECREASE/KEEP from category count and size, 'off' keeps it.
+	"""
+	incr('threshold.adjustments')
+	if mode == 'off':
+		return current_threshold
+	if mode == 'local':
+		if controller is None:
+			return current_threshold
+		return controller.suggest(current_threshold)
+	return llm_adjust_threshold_step(memory, current_threshold)
+
+def llm_adjust_threshold_step(memory, current_threshold):
 	num_categories = len(memory.get('categories', {}))
-	total_tickets = sum(len(cat['examples']) for cat in memory.get('categories', {}).values())
+	# examples is a capped reservoir sample; count is the number of tickets assigned
+	total_tickets = sum(category_count(cat) for cat in memory.get('categories', {}).values())
 	avg_tickets_per_category = total_tickets / num_categories if num_categories else 0
-	print(f"[adjust_threshold] Current: {current_threshold}, Num categories: {num_categories}, Avg tickets/category: {avg_tickets_per_category}")
+	log.debug("Current: %s, Num categories: %s, Avg tickets/category: %s", current_threshold, num_categories, avg_tickets_per_category)
 	resp = llm_adjust_threshold(current_threshold, num_categories, avg_tickets_per_category)
-	print(f"[adjust_threshold] LLM response: {resp}")
+	log.debug("LLM response: %s", resp)
 	if 'INCREASE' in resp.upper():
-		print("[adjust_threshold] Increasing threshold.")
+		log.info("Increasing threshold.")
 		return min(current_threshold + 0.05, 0.99)
 	elif 'DECREASE' in resp.upper():
-		print("[adjust_threshold] Decreasing threshold.")
+		log.info("Decreasing threshold.")
 		return max(current_threshold - 0.05, 0.01)
 	else:
-		print("[adjust_threshold] Keeping threshold.")
+		log.info("Keeping threshold.")
 		return current_threshold
 
 def decide_next_action(state):
@@ -23,19 +188,24 @@ def decide_next_action(state):
 	Decide next action based on state dict.
 	Returns one of: 'assign', 'create', 'merge', 'rename', 'adjust_threshold'
 	"""
-	print(f"[decide_next_action] State: {state}")
-	# Simple heuristic: prioritize assignment, then create, then merge, then adjust threshold
+	log.debug("State: %s", state)
+	# Simple heuristic: apply confirmed merges first (they only appear during periodic
+	# merge passes), then a due threshold adjustment, then assignment, then create,
+	# then rename, then adjust threshold
+	if state.get('can_merge'):
+		log.debug("Action: merge")
+		return 'merge'
+	if state.get('threshold_due'):
+		log.debug("Action: adjust_threshold")
+		return 'adjust_threshold'
 	if state.get('unprocessed_tickets'):
-		print("[decide_next_action] Action: assign")
+		log.debug("Action: assign")
 		return 'assign'
 	if state.get('need_create'):
-		print("[decide_next_action] Action: create")
+		log.debug("Action: create")
 		return 'create'
-	if state.get('can_merge'):
-		print("[decide_next_action] Action: merge")
-		return 'merge'
 	if state.get('can_rename'):
-		print("[decide_next_action] Action: rename")
+		log.debug("Action: rename")
 		return 'rename'
-	print("[decide_next_action] Action: adjust_threshold")
+	log.debug("Action: adjust_threshold")
 	return 'adjust_threshold'
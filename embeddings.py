@@ -1,20 +1,130 @@
-# embeddings.py: Embedding model loading and get_embedding()
-from sentence_transformers import SentenceTransformer
+# embeddings.py: Embedding model loading, batched get_embeddings() and cached get_embedding()
+import hashlib
+import os
+import re
+from collections import OrderedDict
+import numpy as np
+from cache import SQLiteCache, content_hash
+from metrics import get_logger, span, incr
+
+log = get_logger(__name__)
+
+# 'hashing' selects the dependency-free HashingEncoder (offline benchmarks)
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', os.path.join('data', 'embedding_cache.sqlite'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', '200000'))
+EMBEDDING_MEMO_SIZE = int(os.getenv('EMBEDDING_MEMO_SIZE', '10000'))
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
 
 _model = None
+_cache = None
+# In-process LRU in front of the disk cache so repeated texts within a run skip SQLite too
+_memo = OrderedDict()
+
+class HashingEncoder:
+	"""Bag-of-words feature hashing with the SentenceTransformer.encode() interface.
+
+	No model download and no learned semantics: only meant for offline
+	benchmarks and smoke runs where throughput, not quality, is measured.
+	"""
+
+	def __init__(self, dim=384):
+		self.dim = dim
+
+	def get_sentence_embedding_dimension(self):
+		return self.dim
+
+	def encode(self, texts, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+		out = np.zeros((len(texts), self.dim), dtype=np.float32)
+		for row, text in enumerate(texts):
+			for token in re.findall(r'[a-z0-9_]+', str(text).lower()):
+				h = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'little')
+				out[row, h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+		return out
 
 def get_model():
 	global _model
 	if _model is None:
-		print("[get_model] Loading SentenceTransformer model...")
-		_model = SentenceTransformer('all-MiniLM-L6-v2')
-		print("[get_model] Model loaded.")
+		if EMBEDDING_MODEL == 'hashing':
+			log.info("Using HashingEncoder.")
+			_model = HashingEncoder()
+			return _model
+		log.info("Loading SentenceTransformer model...")
+		# Imported here: sentence_transformers (and torch) take seconds to import and
+		# are not needed at all when every text is already in the embedding cache
+		from sentence_transformers import SentenceTransformer
+		_model = SentenceTransformer(EMBEDDING_MODEL)
+		log.info("Model loaded.")
 	return _model
 
+def get_cache():
+	"""Return the shared on-disk embedding cache, or None when disabled (EMBEDDING_CACHE_PATH='')."""
+	global _cache
+	if _cache is None and EMBEDDING_CACHE_PATH:
+		_cache = SQLiteCache(EMBEDDING_CACHE_PATH, max_entries=EMBEDDING_CACHE_MAX_ENTRIES, table='embeddings')
+	return _cache
+
+def _remember(key, vec):
+	_memo[key] = vec
+	_memo.move_to_end(key)
+	while len(_memo) > EMBEDDING_MEMO_SIZE:
+		_memo.popitem(last=False)
+
+def normalize_rows(matrix):
+	"""L2-normalize the rows of a 2D array in place and return it as float32."""
+	matrix = np.asarray(matrix, dtype=np.float32)
+	norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+	norms[norms == 0] = 1.0
+	matrix /= norms
+	return matrix
+
+def get_embeddings(texts, batch_size=EMBEDDING_BATCH_SIZE):
+	"""Embed a list of texts. Returns an (n, dim) float32 matrix of L2-normalized rows.
+
+	Each distinct text is encoded at most once: results are looked up by content
+	hash in the in-process memo and the on-disk cache before calling the model.
+	"""
+	texts = [str(t) for t in texts]
+	if not texts:
+		# Keep the (0, dim) shape so callers can stack or matmul the result; the dimension
+		# comes from the memo when possible so an empty call does not load the model
+		dim = len(next(iter(_memo.values()))) if _memo else get_model().get_sentence_embedding_dimension()
+		return np.zeros((0, dim), dtype=np.float32)
+	keys = [content_hash(EMBEDDING_MODEL, t) for t in texts]
+	vectors = {}
+	for key in keys:
+		if key in _memo:
+			vectors[key] = _memo[key]
+			_memo.move_to_end(key)
+	unique = len(set(keys))
+	missing = [k for k in dict.fromkeys(keys) if k not in vectors]
+	incr('embedding.memo_hits', unique - len(missing))
+	cache = get_cache()
+	if missing and cache is not None:
+		with span('embedding.cache_lookup'):
+			found = cache.get_many(missing)
+		for key, blob in found.items():
+			vec = np.frombuffer(blob, dtype=np.float32)
+			vectors[key] = vec
+			_remember(key, vec)
+		incr('embedding.cache_hits', len(found))
+		missing = [k for k in missing if k not in vectors]
+	if missing:
+		key_to_text = dict(zip(keys, texts))
+		to_encode = [key_to_text[k] for k in missing]
+		log.debug("Encoding %s new texts (%s cached) in batches of %s", len(to_encode), len(texts) - len(to_encode), batch_size)
+		model = get_model()
+		with span('embedding.encode'):
+			encoded = model.encode(to_encode, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+			encoded = normalize_rows(encoded)
+		incr('embedding.encoded', len(to_encode))
+		for key, vec in zip(missing, encoded):
+			vectors[key] = vec
+			_remember(key, vec)
+		if cache is not None:
+			cache.put_many((key, vec.tobytes()) for key, vec in zip(missing, encoded))
+	return np.stack([vectors[k] for k in keys]).astype(np.float32, copy=False)
+
 def get_embedding(text):
-	"""Get embedding for a text string as a list of floats."""
-	print(f"[get_embedding] Getting embedding for text: {text[:60]}{'...' if len(text) > 60 else ''}")
-	model = get_model()
-	emb = model.encode([text])[0]
-	print(f"[get_embedding] Embedding shape: {getattr(emb, 'shape', type(emb))}")
-	return emb.tolist() if hasattr(emb, 'tolist') else list(emb)
+	"""Get embedding for a text string as a list of floats (L2-normalized, cached)."""
+	return get_embeddings([text])[0].tolist()
@@ -0,0 +1,302 @@
+# exemplar_index.py: Approximate nearest-neighbour index over ticket embeddings with top-k category voting
+import os
+from collections import OrderedDict
+import numpy as np
+from metrics import get_logger, span
+
+log = get_logger(__name__)
+
+# 'centroid' scores tickets against one mean embedding per category, 'knn' votes over stored exemplars
+ASSIGN_MODE = os.getenv('ASSIGN_MODE', 'centroid').lower()
+# Neighbours retrieved per ticket for voting
+KNN_K = int(os.getenv('KNN_K', '10'))
+# 'auto' uses hnswlib when installed and the NumPy IVF index otherwise; 'hnsw' or 'ivf' force one
+EXEMPLAR_BACKEND = os.getenv('EXEMPLAR_BACKEND', 'auto').lower()
+# An exemplar this similar to an existing one of the same category is not stored (0 = store all)
+EXEMPLAR_DEDUP_SIMILARITY = float(os.getenv('EXEMPLAR_DEDUP_SIMILARITY', '0.98'))
+# IVF: exemplars before the coarse quantizer is first trained (brute force below that), and lists probed per query
+IVF_TRAIN_MIN = int(os.getenv('IVF_TRAIN_MIN', '4096'))
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', '8'))
+# Recent vote() results kept so add() can de-duplicate without searching again
+_VOTE_MEMO_SIZE = 4096
+
+
+def _normalize(embeddings):
+	vecs = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+	norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+	norms[norms == 0] = 1.0
+	return vecs / norms
+
+
+class _IVFBackend:
+	"""Inverted-file index in pure NumPy.
+
+	Below train_min vectors every query is brute force. Past that a coarse
+	quantizer of ~sqrt(n) spherical k-means centroids is trained, each vector
+	is filed under its nearest centroid, and a query is scored only against
+	the nprobe closest lists. The quantizer is retrained whenever the index
+	has grown 4x, so training cost stays amortized O(1) per added vector.
+	"""
+
+	def __init__(self, dim, train_min=IVF_TRAIN_MIN, nprobe=IVF_NPROBE, seed=0):
+		self.dim = dim
+		self.train_min = train_min
+		self.nprobe = nprobe
+		self._rng = np.random.default_rng(seed)
+		self._vectors = np.zeros((1024, dim), dtype=np.float32)
+		self._size = 0
+		self._centroids = None
+		self._lists = []
+		self._list_arrays = []
+		self._trained_size = 0
+
+	def __len__(self):
+		return self._size
+
+	def add(self, vectors):
+		"""Append normalized rows; returns their ids."""
+		n = len(vectors)
+		if self._size + n > self._vectors.shape[0]:
+			grown = np.zeros((max(self._size + n, self._vectors.shape[0] * 2), self.dim), dtype=np.float32)
+			grown[:self._size] = self._vectors[:self._size]
+			self._vectors = grown
+		ids = np.arange(self._size, self._size + n)
+		self._vectors[self._size:self._size + n] = vectors
+		self._size += n
+		if self._centroids is not None:
+			self._file(ids)
+		if self._size >= self.train_min and self._size >= 4 * self._trained_size:
+			self._train()
+		return ids
+
+	def _file(self, ids):
+		nearest = np.argmax(self._vectors[ids] @ self._centroids.T, axis=1)
+		for row, lst in zip(ids, nearest):
+			self._lists[lst].append(int(row))
+			self._list_arrays[lst] = None
+
+	def _train(self, iterations=8):
+		with span('exemplars.train'):
+			n = self._size
+			# At least 16 lists, but never more than there are vectors (train_min may be set low)
+			nlist = int(min(max(np.sqrt(n), 16), 4096, n))
+			sample_size = min(n, nlist * 64)
+			sample = self._vectors[self._rng.choice(n, sample_size, replace=False)]
+			centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+			for _ in range(iterations):
+				assign = np.argmax(sample @ centroids.T, axis=1)
+				sums = np.zeros_like(centroids)
+				np.add.at(sums, assign, sample)
+				empty = ~sums.any(axis=1)
+				# Re-seed empty lists from random sample rows
+				sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+				centroids = _normalize(sums)
+			self._centroids = centroids
+			self._lists = [[] for _ in range(nlist)]
+			self._list_arrays = [None] * nlist
+			for start in range(0, n, 65536):
+				self._file(np.arange(start, min(start + 65536, n)))
+			self._trained_size = n
+		log.debug("Trained IVF quantizer: %s lists over %s exemplars", nlist, n)
+
+	def _candidates(self, query):
+		if self._centroids is None:
+			return None
+		nprobe = min(self.nprobe, len(self._lists))
+		coarse = self._centroids @ query
+		probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+		arrays = []
+		for lst in probe:
+			if self._list_arrays[lst] is None:
+				self._list_arrays[lst] = np.asarray(self._lists[lst], dtype=np.int64)
+			arrays.append(self._list_arrays[lst])
+		return np.concatenate(arrays)
+
+	def search(self, query, k):
+		"""Return (ids, similarities) of up to k nearest rows, best first."""
+		rows = self._candidates(query)
+		if rows is None:
+			sims = self._vectors[:self._size] @ query
+			rows = np.arange(self._size)
+		else:
+			sims = self._vectors[rows] @ query
+		k = min(k, len(rows))
+		if k == 0:
+			return rows[:0], sims[:0]
+		top = np.argpartition(-sims, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+		top = top[np.argsort(-sims[top])]
+		return rows[top], sims[top]
+
+
+class _HNSWBackend:
+	"""hnswlib graph index (inner product on normalized vectors)."""
+
+	def __init__(self, dim, ef_construction=200, m=16, ef=64):
+		import hnswlib
+		self.dim = dim
+		self.ef = ef
+		self._index = hnswlib.Index(space='ip', dim=dim)
+		self._index.init_index(max_elements=1024, ef_construction=ef_construction, M=m)
+		self._size = 0
+
+	def __len__(self):
+		return self._size
+
+	def add(self, vectors):
+		n = len(vectors)
+		capacity = self._index.get_max_elements()
+		if self._size + n > capacity:
+			self._index.resize_index(max(self._size + n, capacity * 2))
+		ids = np.arange(self._size, self._size + n)
+		self._index.add_items(vectors, ids)
+		self._size += n
+		return ids
+
+	def search(self, query, k):
+		k = min(k, self._size)
+		if k == 0:
+			return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+		self._index.set_ef(max(self.ef, k))
+		ids, distances = self._index.knn_query(query, k=k)
+		# hnswlib's 'ip' distance is 1 - inner product
+		return ids[0].astype(np.int64), 1.0 - distances[0]
+
+
+class ExemplarIndex:
+	"""Ticket embeddings labelled with their category, searched approximately.
+
+	Unlike CategoryIndex (one centroid per category), this keeps individual
+	exemplars, so a multi-modal category is matched by whichever of its modes
+	is closest. Labels are kept per row on this side, so merges and renames
+	relabel rows without touching the ANN structure.
+	"""
+
+	def __init__(self, dim=None, backend=EXEMPLAR_BACKEND, dedup_similarity=EXEMPLAR_DEDUP_SIMILARITY):
+		self.dim = dim
+		self.backend_name = backend
+		self.dedup_similarity = dedup_similarity
+		self._backend = None
+		self._labels = np.zeros(1024, dtype=np.int32)
+		self._names = []
+		self._label_ids = {}
+		self._voted = OrderedDict()
+
+	@classmethod
+	def from_memory(cls, memory, get_embeddings, embed_examples=True, **kwargs):
+		"""Seed an index with the embeddings of each category's stored examples.
+
+		Pass embed_examples=False when the examples are a different field than
+		the text being assigned: their embeddings would not be comparable, so the
+		index then starts empty and fills with the tickets assigned in this run.
+		"""
+		index = cls(**kwargs)
+		if not embed_examples:
+			log.info("Exemplar index starts empty: stored examples are not the assigned text field")
+			return index
+		for name, data in memory.get('categories', {}).items():
+			if data.get('examples'):
+				index.add_many(name, get_embeddings(data['examples']))
+		log.info("Exemplar index (%s): %s exemplars over %s categories", index.backend_name, len(index), len(memory.get('categories', {})))
+		return index
+
+	def __len__(self):
+		return 0 if self._backend is None else len(self._backend)
+
+	def _make_backend(self, dim):
+		self.dim = dim
+		if self.backend_name in ('auto', 'hnsw'):
+			try:
+				self._backend = _HNSWBackend(dim)
+				self.backend_name = 'hnsw'
+				return
+			except ImportError as e:
+				if self.backend_name == 'hnsw':
+					raise ImportError("EXEMPLAR_BACKEND=hnsw requires hnswlib (pip install hnswlib)") from e
+		self._backend = _IVFBackend(dim)
+		self.backend_name = 'ivf'
+
+	def _label_id(self, name):
+		label = self._label_ids.get(name)
+		if label is None:
+			label = self._label_ids[name] = len(self._names)
+			self._names.append(name)
+		return label
+
+	def add_many(self, name, embeddings):
+		"""Store embeddings as exemplars of category name (no de-duplication)."""
+		vecs = _normalize(embeddings)
+		if self._backend is None:
+			self._make_backend(vecs.shape[1])
+		ids = self._backend.add(vecs)
+		if ids[-1] >= len(self._labels):
+			grown = np.zeros(max(ids[-1] + 1, len(self._labels) * 2), dtype=np.int32)
+			grown[:len(self._labels)] = self._labels
+			self._labels = grown
+		self._labels[ids] = self._label_id(name)
+
+	def add(self, name, embedding):
+		"""Store one exemplar unless a near-duplicate of the same category is already stored.
+
+		The nearest neighbour found when embedding was last passed to vote() is
+		reused, so the usual vote-then-add sequence costs one search. Returns True
+		if it was stored.
+		"""
+		if self.dedup_similarity and self._backend is not None:
+			nearest = self._voted.pop(_normalize(embedding)[0].tobytes(), None)
+			if nearest is None:
+				top = self.search(embedding, k=1)
+				nearest = top[0] if top else None
+			if nearest and nearest[0] == name and nearest[1] >= self.dedup_similarity:
+				return False
+		self.add_many(name, embedding)
+		return True
+
+	def relabel(self, old_name, new_name):
+		"""Move all exemplars of old_name to new_name (after a merge or rename)."""
+		if old_name == new_name or old_name not in self._label_ids:
+			return
+		old = self._label_ids.pop(old_name)
+		new = self._label_id(new_name)
+		n = len(self)
+		labels = self._labels[:n]
+		labels[labels == old] = new
+		# The freed label id keeps its slot in _names but no row refers to it any more
+		self._names[old] = None
+		# Remembered neighbours may carry the old name
+		self._voted.clear()
+
+	def search(self, embedding, k=KNN_K):
+		"""Return up to k (category, similarity) pairs for the nearest exemplars, best first."""
+		if self._backend is None:
+			return []
+		query = _normalize(embedding)[0]
+		with span('exemplars.search'):
+			ids, sims = self._backend.search(query, k)
+		return [(self._names[self._labels[i]], float(s)) for i, s in zip(ids, sims)]
+
+	def vote(self, embedding, threshold, k=KNN_K):
+		"""Top-k neighbour vote: returns (category, score, best_similarity).
+
+		Only neighbours with similarity >= threshold vote, each with its
+		similarity as weight; category is the heaviest, score its closest
+		neighbour's similarity. category is None when no neighbour reaches the
+		threshold; best_similarity is the nearest exemplar's similarity (None if
+		the index is empty).
+		"""
+		neighbours = self.search(embedding, k)
+		if not neighbours:
+			return None, None, None
+		if self.dedup_similarity:
+			self._voted[_normalize(embedding)[0].tobytes()] = neighbours[0]
+			while len(self._voted) > _VOTE_MEMO_SIZE:
+				self._voted.popitem(last=False)
+		votes = {}
+		closest = {}
+		for name, sim in neighbours:
+			if sim >= threshold:
+				votes[name] = votes.get(name, 0.0) + sim
+				closest.setdefault(name, sim)
+		if not votes:
+			return None, neighbours[0][1], neighbours[0][1]
+		winner = max(votes, key=votes.get)
+		return winner, closest[winner], neighbours[0][1]
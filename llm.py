@@ -1,38 +1,237 @@
 
 # llm.py: Wrapper for calling OpenRouter API (GPT-4 Turbo) or other OpenAI-compatible endpoints
 import os
-import requests
 import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from cache import SQLiteCache, content_hash
+from metrics import get_logger, span, incr
 load_dotenv()
 
+log = get_logger(__name__)
+
 # --- OpenRouter API (GPT-4 Turbo or other) ---
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
 OPENROUTER_API_BASE = os.getenv('OPENROUTER_API_BASE', 'https://openrouter.ai/api/v1')
 OPENROUTER_MODEL = os.getenv('OPENROUTER_MODEL', 'openai/gpt-oss-20b:free')
+_DEFAULT_API_BASE = 'https://openrouter.ai/api/v1'
+
+# --- Client tuning ---
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+LLM_READ_TIMEOUT = float(os.getenv('LLM_READ_TIMEOUT', '120'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '5'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '1.0'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '30'))
+LLM_MAX_WORKERS = int(os.getenv('LLM_MAX_WORKERS', '8'))
+# Requests per second allowed by the token bucket (0 disables rate limiting); split evenly across worker processes
+LLM_RATE_LIMIT = float(os.getenv('LLM_RATE_LIMIT', '5'))
+LLM_RATE_BURST = int(os.getenv('LLM_RATE_BURST', '10'))
+
+# --- Response cache ---
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', os.path.join('data', 'llm_cache.sqlite'))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '50000'))
+# Seconds before a cached response expires (0 = never)
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '0'))
+LLM_CACHE_DISABLED = os.getenv('LLM_CACHE_DISABLED', '').lower() in ('1', 'true', 'yes')
+
+_RETRY_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+	"""Thread-safe token bucket: acquire() blocks until a request may be sent."""
+
+	def __init__(self, rate, burst):
+		self.rate = rate
+		self.capacity = max(1, burst)
+		self._tokens = float(self.capacity)
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self):
+		if self.rate <= 0:
+			return
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+				self._updated = now
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return
+				wait = (1 - self._tokens) / self.rate
+			time.sleep(wait)
+
+
+class LLMClient:
+	"""OpenAI-compatible chat client with a pooled session, timeouts, retries and rate limiting.
+
+	One instance is shared by the whole process (see get_client()); it is safe
+	to call complete() from many threads at once.
+	"""
+
+	def __init__(self, api_base=OPENROUTER_API_BASE, api_key=OPENROUTER_API_KEY, model=OPENROUTER_MODEL,
+			connect_timeout=LLM_CONNECT_TIMEOUT, read_timeout=LLM_READ_TIMEOUT, max_retries=LLM_MAX_RETRIES,
+			backoff_base=LLM_BACKOFF_BASE, backoff_max=LLM_BACKOFF_MAX, max_workers=LLM_MAX_WORKERS,
+			rate_limit=LLM_RATE_LIMIT, rate_burst=LLM_RATE_BURST):
+		self.api_base = api_base.rstrip('/')
+		self.api_key = api_key
+		self.model = model
+		self.timeout = (connect_timeout, read_timeout)
+		self.max_retries = max_retries
+		self.backoff_base = backoff_base
+		self.backoff_max = backoff_max
+		self.max_workers = max_workers
+		self.rate_limiter = TokenBucket(rate_limit, rate_burst)
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, max_workers))
+		self.session.mount('http://', adapter)
+		self.session.mount('https://', adapter)
+		self.session.headers['Content-Type'] = 'application/json'
+		if api_key:
+			self.session.headers['Authorization'] = f"Bearer {api_key}"
+		self._executor = None
+		self._executor_lock = threading.Lock()
+
+	def _backoff(self, attempt, response=None):
+		retry_after = response.headers.get('Retry-After') if response is not None else None
+		if retry_after:
+			try:
+				return min(float(retry_after), self.backoff_max)
+			except ValueError:
+				pass
+		delay = min(self.backoff_base * (2 ** attempt), self.backoff_max)
+		return delay * (0.5 + random.random() / 2)
 
-def call_openrouter(prompt, model=OPENROUTER_MODEL):
-	"""Call OpenRouter API and return the response text."""
-	if not OPENROUTER_API_KEY:
-		raise RuntimeError("OPENROUTER_API_KEY not set in .env")
-	print(f"[call_openrouter] Calling OpenRouter. Model: {model}\nPrompt: {prompt[:100]}{'...' if len(prompt) > 100 else ''}")
-	headers = {
-		"Authorization": f"Bearer {OPENROUTER_API_KEY}",
-		"Content-Type": "application/json"
-	}
-	data = {
-		"model": model,
-		"messages": [
-			{"role": "user", "content": prompt}
-		]
-	}
-	response = requests.post(f"{OPENROUTER_API_BASE}/chat/completions", headers=headers, data=json.dumps(data))
-	if response.status_code != 200:
-		print(f"[call_openrouter] OpenRouter error: {response.text}")
-		raise RuntimeError(f"OpenRouter error: {response.text}")
-	result = response.json()
-	output = result['choices'][0]['message']['content'].strip()
-	print(f"[call_openrouter] OpenRouter output: {output}")
+	def complete(self, prompt, model=None):
+		"""Send a single-message chat completion and return the response text."""
+		if not self.api_key and self.api_base == _DEFAULT_API_BASE:
+			raise RuntimeError("OPENROUTER_API_KEY not set in .env")
+		model = model or self.model
+		data = json.dumps({
+			"model": model,
+			"messages": [
+				{"role": "user", "content": prompt}
+			]
+		})
+		url = f"{self.api_base}/chat/completions"
+		for attempt in range(self.max_retries + 1):
+			with span('llm.rate_limit_wait'):
+				self.rate_limiter.acquire()
+			incr('llm.requests')
+			try:
+				with span('llm.request'):
+					response = self.session.post(url, data=data, timeout=self.timeout)
+			except (requests.ConnectionError, requests.Timeout) as e:
+				if attempt >= self.max_retries:
+					raise RuntimeError(f"OpenRouter request failed: {e}") from e
+				delay = self._backoff(attempt)
+				log.warning("%s, retrying in %.1fs", type(e).__name__, delay)
+				incr('llm.retries')
+				time.sleep(delay)
+				continue
+			if response.status_code == 200:
+				result = response.json()
+				return result['choices'][0]['message']['content'].strip()
+			if response.status_code in _RETRY_STATUS and attempt < self.max_retries:
+				delay = self._backoff(attempt, response)
+				log.warning("HTTP %s, retrying in %.1fs", response.status_code, delay)
+				incr('llm.retries')
+				time.sleep(delay)
+				continue
+			log.error("OpenRouter error: %s", response.text)
+			raise RuntimeError(f"OpenRouter error: {response.text}")
+
+	def executor(self):
+		with self._executor_lock:
+			if self._executor is None:
+				self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm')
+			return self._executor
+
+	def map(self, fn, arg_tuples):
+		"""Run fn(*args) for each args tuple on the client's thread pool; results keep input order."""
+		arg_tuples = list(arg_tuples)
+		if len(arg_tuples) <= 1:
+			return [fn(*args) for args in arg_tuples]
+		futures = [self.executor().submit(fn, *args) for args in arg_tuples]
+		return [f.result() for f in futures]
+
+	def close(self):
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+		self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+_response_cache = None
+_rate_share = 1
+
+def get_client():
+	"""Return the process-wide LLMClient, creating it on first use."""
+	global _client
+	with _client_lock:
+		if _client is None:
+			_client = LLMClient(rate_limit=LLM_RATE_LIMIT / _rate_share, rate_burst=max(1, LLM_RATE_BURST // _rate_share))
+		return _client
+
+def set_rate_share(shares):
+	"""Limit this process's client to 1/shares of LLM_RATE_LIMIT and LLM_RATE_BURST.
+
+	Each worker process has its own token bucket, so without this the
+	provider would see shares times the configured rate.
+	"""
+	global _rate_share, _client
+	with _client_lock:
+		_rate_share = max(1, shares)
+		if _client is not None:
+			_client.rate_limiter = TokenBucket(LLM_RATE_LIMIT / _rate_share, max(1, LLM_RATE_BURST // _rate_share))
+
+def get_response_cache():
+	"""Return the shared LLM response cache, or None when disabled."""
+	global _response_cache
+	if LLM_CACHE_DISABLED or not LLM_CACHE_PATH:
+		return None
+	with _client_lock:
+		if _response_cache is None:
+			_response_cache = SQLiteCache(LLM_CACHE_PATH, max_entries=LLM_CACHE_MAX_ENTRIES, table='responses', ttl=LLM_CACHE_TTL)
+		return _response_cache
+
+def normalize_prompt(prompt):
+	"""Collapse whitespace so trivially different prompts share a cache entry."""
+	return ' '.join(prompt.split())
+
+def llm_cache_stats():
+	cache = get_response_cache()
+	return cache.stats() if cache is not None else {'hits': 0, 'misses': 0}
+
+def call_openrouter(prompt, model=OPENROUTER_MODEL, use_cache=True):
+	"""Call OpenRouter API and return the response text.
+
+	Responses are cached by endpoint + model + normalized prompt (so answers from
+	a local or stub endpoint never stand in for the real one); pass
+	use_cache=False (or set LLM_CACHE_DISABLED=1) to always hit the API.
+	"""
+	cache = get_response_cache() if use_cache else None
+	key = content_hash(get_client().api_base, model, normalize_prompt(prompt))
+	if cache is not None:
+		cached = cache.get(key)
+		if cached is not None:
+			output = cached.decode('utf-8')
+			incr('llm.cache_hits')
+			log.debug("Cache hit. Output: %s", output)
+			return output
+		incr('llm.cache_misses')
+	log.debug("Calling OpenRouter. Model: %s\nPrompt: %s%s", model, prompt[:100], '...' if len(prompt) > 100 else '')
+	output = get_client().complete(prompt, model)
+	log.debug("OpenRouter output: %s", output)
+	if cache is not None:
+		cache.put(key, output.encode('utf-8'))
 	return output
 
 
@@ -57,18 +256,32 @@ def llm_suggest_category_name(tickets):
 		"Incorrect: Category: Network Issue"
 		"Now, what is the best category for these tickets?"
 	)
-	print(f"[llm_suggest_category_name] Tickets: {tickets}")
-	return call_openrouter(prompt)
+	log.debug("Tickets: %s", tickets)
+	incr('llm.calls.naming')
+	with span('llm.naming'):
+		return call_openrouter(prompt)
 
 def llm_merge_decision(name_a, examples_a, name_b, examples_b):
 	prompt = f"Category A: {name_a}, Tickets: {examples_a} | Category B: {name_b}, Tickets: {examples_b}. Should these be merged? Respond YES or NO."
-	print(f"[llm_merge_decision] A: {name_a}, B: {name_b}")
-	return call_openrouter(prompt)
+	log.debug("A: %s, B: %s", name_a, name_b)
+	incr('llm.calls.merge')
+	with span('llm.merge'):
+		return call_openrouter(prompt)
+
+def llm_suggest_category_names(ticket_groups):
+	"""Name several groups of tickets concurrently. Returns one response per group, in order."""
+	return get_client().map(llm_suggest_category_name, [(group,) for group in ticket_groups])
+
+def llm_merge_decisions(pairs):
+	"""Judge several (name_a, examples_a, name_b, examples_b) pairs concurrently. Returns responses in order."""
+	return get_client().map(llm_merge_decision, pairs)
 
 def llm_adjust_threshold(current_threshold, num_categories, avg_tickets_per_category):
 	prompt = f"Current similarity threshold: {current_threshold}. Categories: {num_categories}, Avg tickets/category: {avg_tickets_per_category}. Respond with INCREASE / DECREASE / KEEP."
-	print(f"[llm_adjust_threshold] Threshold: {current_threshold}, Categories: {num_categories}, Avg: {avg_tickets_per_category}")
-	return call_openrouter(prompt)
+	log.debug("Threshold: %s, Categories: %s, Avg: %s", current_threshold, num_categories, avg_tickets_per_category)
+	incr('llm.calls.threshold')
+	with span('llm.threshold'):
+		return call_openrouter(prompt)
 
 # --- DeepSeek R1 via Ollama (commented) ---
 # import subprocess
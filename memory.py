@@ -1,30 +1,69 @@
-# memory.py: Functions to load/save category memory as JSON
+# memory.py: Functions to load/save category memory (JSON file or binary MemoryStore directory)
 import json
 import os
+import numpy as np
+from memory_store import MemoryStore
+from metrics import get_logger, timed
+
+log = get_logger(__name__)
+
+# One MemoryStore per directory so its journal handle and snapshot survive between saves
+_stores = {}
+
+def _is_json_path(memory_path):
+	return memory_path.lower().endswith('.json')
+
+def get_store(store_path):
+	key = os.path.abspath(store_path)
+	if key not in _stores:
+		_stores[key] = MemoryStore(store_path)
+	return _stores[key]
+
+def _json_default(value):
+	# Centroids loaded from a MemoryStore are NumPy arrays
+	if isinstance(value, np.ndarray):
+		return value.tolist()
+	raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
 def load_memory(memory_path):
-	"""Load category memory from a JSON file. If file does not exist, create it as empty and return empty dict."""
-	print(f"[load_memory] Loading memory from: {memory_path}")
+	"""Load category memory from a JSON file or a MemoryStore directory.
+
+	JSON: if the file does not exist, create it as empty and return empty dict.
+	Store: if the store does not exist but '<memory_path>.json' does, that file is imported first.
+	"""
+	log.info("Loading memory from: %s", memory_path)
+	if not _is_json_path(memory_path):
+		store = get_store(memory_path)
+		if not store.exists() and os.path.exists(memory_path + '.json'):
+			store.import_json(memory_path + '.json')
+		return store.load()
 	if not os.path.exists(memory_path):
-		print(f"[load_memory] File not found. Creating empty file.")
+		log.info("File not found. Creating empty file.")
 		with open(memory_path, 'w', encoding='utf-8') as f:
 			json.dump({}, f, indent=2, ensure_ascii=False)
 		return {}
 	with open(memory_path, 'r', encoding='utf-8') as f:
 		data = json.load(f)
-		print(f"[load_memory] Loaded memory. Keys: {list(data.keys())}")
+		log.info("Loaded memory. Keys: %s", list(data.keys()))
 		return data
 
+@timed('memory.save')
 def save_memory(memory_path, memory):
-	"""Save category memory to a JSON file."""
-	print(f"[save_memory] Saving memory to: {memory_path}")
+	"""Save category memory to a JSON file, or journal the changes to a MemoryStore directory."""
+	log.debug("Saving memory to: %s", memory_path)
+	if not _is_json_path(memory_path):
+		get_store(memory_path).save(memory)
+		return
 	with open(memory_path, 'w', encoding='utf-8') as f:
-		json.dump(memory, f, indent=2, ensure_ascii=False)
-	print(f"[save_memory] Memory saved.")
+		json.dump(memory, f, indent=2, ensure_ascii=False, default=_json_default)
+	log.debug("Memory saved.")
 
 # Clear the memory file at the start of each run
 def clear_memory_file(memory_path):
-	print(f"[clear_memory_file] Clearing memory file: {memory_path}")
+	log.info("Clearing memory file: %s", memory_path)
+	if not _is_json_path(memory_path):
+		get_store(memory_path).clear()
+		return
 	with open(memory_path, 'w', encoding='utf-8') as f:
 		json.dump({}, f, indent=2, ensure_ascii=False)
-	print(f"[clear_memory_file] Memory file cleared.")
+	log.info("Memory file cleared.")
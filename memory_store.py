@@ -0,0 +1,295 @@
+# memory_store.py: Binary category memory store (float32 centroids + append-only journal)
+import base64
+import copy
+import json
+import os
+import numpy as np
+from metrics import get_logger, span
+
+log = get_logger(__name__)
+
+# Number of journal records after which save() folds the journal back into the base files
+JOURNAL_COMPACT_EVERY = int(os.getenv('MEMORY_JOURNAL_COMPACT_EVERY', '2000'))
+
+# Base files written before generations were introduced; newer stores use centroids.<n>.npy / examples.<n>.json
+CENTROIDS_FILE = 'centroids.npy'
+META_FILE = 'meta.json'
+EXAMPLES_FILE = 'examples.json'
+JOURNAL_FILE = 'journal.jsonl'
+
+
+def _encode_vector(vec):
+	return base64.b64encode(np.asarray(vec, dtype=np.float32).tobytes()).decode('ascii')
+
+def _decode_vector(text):
+	return np.frombuffer(base64.b64decode(text), dtype=np.float32)
+
+
+class MemoryStore:
+	"""Category memory kept as a directory instead of one big JSON file.
+
+	Layout:
+		centroids.<n>.npy  float32 (n, dim) matrix, memory-mapped on load (zero-copy)
+		examples.<n>.json  example texts per category
+		meta.json          category names (row order), per-category scalar fields and
+		                   the generation <n> of the base files it belongs to
+		journal.jsonl      mutations since the last compaction, one JSON record per line
+
+	Each compaction writes a new generation of base files and then replaces
+	meta.json, so a crash at any point leaves meta.json naming a complete,
+	matching set of files.
+
+	save() diffs the in-memory dict against what the store last saw and only
+	appends the changed categories to the journal, so each save costs O(changes)
+	on disk instead of rewriting every centroid as text. Journal records are
+	idempotent, so replaying a journal over a newer base is harmless.
+
+	A category counts as changed when its embedding is replaced by a new object
+	or a list / writable array embedding is updated in place (compared against
+	a copy taken at the last save), or when its fields or examples differ.
+	Read-only arrays, such as the memory-mapped centroids from load(), cannot
+	change in place and are compared by identity only.
+	"""
+
+	def __init__(self, path, compact_every=JOURNAL_COMPACT_EVERY):
+		self.path = path
+		self.compact_every = compact_every
+		self._snapshot = {}
+		self._snapshot_extra = {}
+		self._journal = None
+		self._journal_records = 0
+
+	def _file(self, name):
+		return os.path.join(self.path, name)
+
+	def exists(self):
+		return os.path.exists(self._file(META_FILE))
+
+	def _read_meta(self):
+		with open(self._file(META_FILE), 'r', encoding='utf-8') as f:
+			return json.load(f)
+
+	# --- Loading ---
+
+	def load(self):
+		"""Load the memory dict. Centroids are read-only views into the memory-mapped matrix."""
+		log.info("Loading memory store: %s", self.path)
+		memory = {'categories': {}}
+		if self.exists():
+			meta = self._read_meta()
+			with open(self._file(meta.get('examples', EXAMPLES_FILE)), 'r', encoding='utf-8') as f:
+				examples = json.load(f)
+			centroids = None
+			if meta['names']:
+				centroids = np.load(self._file(meta.get('centroids', CENTROIDS_FILE)), mmap_mode='r')
+				if len(centroids) != len(meta['names']):
+					raise ValueError(f"Memory store {self.path} is inconsistent: {len(meta['names'])} categories "
+						f"but {len(centroids)} centroid rows")
+			for row, name in enumerate(meta['names']):
+				entry = dict(meta['fields'].get(name, {}))
+				entry['examples'] = examples.get(name, [])
+				entry['embedding'] = centroids[row]
+				memory['categories'][name] = entry
+			memory.update(meta.get('extra', {}))
+		self._journal_records = self._replay(memory)
+		self._take_snapshot(memory)
+		log.info("Loaded %s categories (%s journal records replayed)", len(memory['categories']), self._journal_records)
+		return memory
+
+	def _replay(self, memory):
+		journal_path = self._file(JOURNAL_FILE)
+		if not os.path.exists(journal_path):
+			return 0
+		cats = memory['categories']
+		count = 0
+		with open(journal_path, 'r', encoding='utf-8') as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except json.JSONDecodeError:
+					# A torn final line from an interrupted write; everything before it is intact
+					log.warning("Ignoring corrupt journal line.")
+					break
+				count += 1
+				op = record['op']
+				name = record.get('name')
+				if op == 'put':
+					entry = cats.setdefault(name, {'examples': []})
+					for key in [k for k in entry if k not in ('examples', 'embedding')]:
+						del entry[key]
+					entry.update(record['fields'])
+					entry['embedding'] = _decode_vector(record['embedding'])
+				elif op == 'examples':
+					entry = cats.setdefault(name, {'examples': []})
+					examples = list(entry.get('examples', []))
+					examples[record['start']:] = record['items']
+					entry['examples'] = examples
+				elif op == 'delete':
+					cats.pop(name, None)
+				elif op == 'extra':
+					memory.update(record['values'])
+		return count
+
+	# --- Saving ---
+
+	@staticmethod
+	def _fields(entry):
+		return {k: v for k, v in entry.items() if k not in ('examples', 'embedding')}
+
+	@staticmethod
+	def _extra(memory):
+		return {k: v for k, v in memory.items() if k != 'categories'}
+
+	@staticmethod
+	def _copy_extra(memory):
+		# Deep copy: sections such as 'aliases' are updated in place and would otherwise never differ
+		return copy.deepcopy(MemoryStore._extra(memory))
+
+	@staticmethod
+	def _embedding_copy(embedding):
+		if isinstance(embedding, np.ndarray):
+			return embedding.copy() if embedding.flags.writeable else None
+		return list(embedding)
+
+	@staticmethod
+	def _embedding_changed(embedding, snap):
+		if embedding is not snap[0]:
+			return True
+		if snap[1] is None:
+			return False
+		if isinstance(snap[1], np.ndarray):
+			return not np.array_equal(embedding, snap[1])
+		return embedding != snap[1]
+
+	def _snapshot_entry(self, entry):
+		# (embedding object, value copy for in-place changes, examples, fields)
+		embedding = entry['embedding']
+		return (embedding, self._embedding_copy(embedding), list(entry.get('examples', [])),
+			copy.deepcopy(self._fields(entry)))
+
+	def _take_snapshot(self, memory):
+		self._snapshot = {name: self._snapshot_entry(entry) for name, entry in memory.get('categories', {}).items()}
+		self._snapshot_extra = self._copy_extra(memory)
+
+	def _update_snapshot(self, memory, records):
+		cats = memory.get('categories', {})
+		for record in records:
+			name = record.get('name')
+			if record['op'] == 'delete':
+				self._snapshot.pop(name, None)
+			elif record['op'] == 'extra':
+				self._snapshot_extra = self._copy_extra(memory)
+			else:
+				self._snapshot[name] = self._snapshot_entry(cats[name])
+
+	def _diff(self, memory):
+		records = []
+		cats = memory.get('categories', {})
+		for name, entry in cats.items():
+			snap = self._snapshot.get(name)
+			fields = self._fields(entry)
+			if snap is None or self._embedding_changed(entry['embedding'], snap) or fields != snap[3]:
+				records.append({'op': 'put', 'name': name, 'embedding': _encode_vector(entry['embedding']), 'fields': fields})
+			examples = entry.get('examples', [])
+			old = snap[2] if snap is not None else []
+			if len(examples) >= len(old) and examples[:len(old)] == old:
+				if len(examples) > len(old):
+					records.append({'op': 'examples', 'name': name, 'start': len(old), 'items': examples[len(old):]})
+			else:
+				records.append({'op': 'examples', 'name': name, 'start': 0, 'items': list(examples)})
+		for name in self._snapshot:
+			if name not in cats:
+				records.append({'op': 'delete', 'name': name})
+		extra = self._extra(memory)
+		if extra != self._snapshot_extra:
+			records.append({'op': 'extra', 'values': extra})
+		return records
+
+	def save(self, memory):
+		"""Append the changes since the last load/save to the journal, compacting when it grows large."""
+		records = self._diff(memory)
+		if not records:
+			return
+		os.makedirs(self.path, exist_ok=True)
+		if not self.exists():
+			self.compact(memory)
+			return
+		if self._journal is None:
+			self._journal = open(self._file(JOURNAL_FILE), 'a', encoding='utf-8')
+		self._journal.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+		self._journal.flush()
+		self._journal_records += len(records)
+		self._update_snapshot(memory, records)
+		log.debug("Journaled %s records (%s since compaction)", len(records), self._journal_records)
+		if self._journal_records >= self.compact_every:
+			self.compact(memory)
+
+	def compact(self, memory):
+		"""Rewrite the base files from the memory dict and truncate the journal."""
+		with span('memory.compact'):
+			self._compact(memory)
+
+	def _compact(self, memory):
+		log.info("Compacting memory store: %s", self.path)
+		os.makedirs(self.path, exist_ok=True)
+		cats = memory.get('categories', {})
+		names = list(cats)
+		if names:
+			centroids = np.stack([np.asarray(cats[n]['embedding'], dtype=np.float32) for n in names])
+		else:
+			centroids = np.zeros((0, 0), dtype=np.float32)
+		generation = self._read_meta().get('generation', 0) + 1 if self.exists() else 1
+		meta = {
+			'generation': generation,
+			'centroids': f'centroids.{generation}.npy',
+			'examples': f'examples.{generation}.json',
+			'names': names,
+			'fields': {n: self._fields(cats[n]) for n in names},
+			'extra': self._extra(memory),
+		}
+		examples = {n: cats[n].get('examples', []) for n in names}
+		# Nothing refers to the new generation's files until meta.json is replaced, which is the commit point
+		with open(self._file(meta['centroids']), 'wb') as f:
+			np.save(f, centroids)
+		with open(self._file(meta['examples']), 'w', encoding='utf-8') as f:
+			json.dump(examples, f, ensure_ascii=False)
+		with open(self._file(META_FILE + '.tmp'), 'w', encoding='utf-8') as f:
+			json.dump(meta, f, ensure_ascii=False)
+		os.replace(self._file(META_FILE + '.tmp'), self._file(META_FILE))
+		self._remove_stale_base_files(meta)
+		if self._journal is not None:
+			self._journal.close()
+			self._journal = None
+		open(self._file(JOURNAL_FILE), 'w', encoding='utf-8').close()
+		self._journal_records = 0
+		self._take_snapshot(memory)
+
+	def _remove_stale_base_files(self, meta):
+		keep = {meta['centroids'], meta['examples']}
+		for name in os.listdir(self.path):
+			stale = name in (CENTROIDS_FILE, EXAMPLES_FILE) or (
+				name.startswith(('centroids.', 'examples.')) and name.endswith(('.npy', '.json', '.tmp')))
+			if stale and name not in keep:
+				try:
+					os.remove(self._file(name))
+				except OSError:
+					# Still memory-mapped on platforms that refuse to delete open files; removed by a later compaction
+					log.debug("Could not remove old base file %s", name)
+
+	def clear(self):
+		"""Reset the store to an empty memory."""
+		self.compact({'categories': {}})
+
+	def import_json(self, json_path):
+		"""Replace the store contents with a legacy category_memory.json file."""
+		log.info("Importing %s into %s", json_path, self.path)
+		with open(json_path, 'r', encoding='utf-8') as f:
+			memory = json.load(f)
+		memory.setdefault('categories', {})
+		self.compact(memory)
+		return memory
+
+	def close(self):
+		if self._journal is not None:
+			self._journal.close()
+			self._journal = None
@@ -0,0 +1,110 @@
+# merge_candidates.py: Rank category pairs for merging by centroid similarity
+import os
+import numpy as np
+from metrics import get_logger, span
+
+log = get_logger(__name__)
+
+# Only pairs whose centroid similarity falls inside [MERGE_MIN_SIMILARITY, MERGE_MAX_SIMILARITY] are sent to the LLM
+MERGE_MIN_SIMILARITY = float(os.getenv('MERGE_MIN_SIMILARITY', '0.6'))
+MERGE_MAX_SIMILARITY = float(os.getenv('MERGE_MAX_SIMILARITY', '1.0'))
+# At most this many pairs are judged per merge pass
+MERGE_MAX_CANDIDATES = int(os.getenv('MERGE_MAX_CANDIDATES', '5'))
+# Tickets between periodic merge passes (0 = only once all tickets are assigned)
+MERGE_INTERVAL = int(os.getenv('MERGE_INTERVAL', '50'))
+# A judged pair is asked again only once its centroid similarity has moved by more than this
+MERGE_REJUDGE_DELTA = float(os.getenv('MERGE_REJUDGE_DELTA', '0.02'))
+# Memory section holding the judged pairs, so resumed and incremental runs do not ask again
+MERGE_JUDGED_KEY = 'merge_judged'
+
+_BLOCK_ROWS = 1024
+
+
+class MergeTracker:
+	"""Remembers which category pairs have been judged, and at which centroid versions.
+
+	A pair is only asked again once either category's centroid has changed
+	(its CategoryIndex version was bumped) since the last decision and, when
+	similarities are given, their similarity has moved by more than
+	rejudge_delta. Centroids drift a little with every assigned ticket, so
+	versions alone would re-ask every active pair.
+
+	save_to() stores the judged pairs in the memory dict and from_memory()
+	restores them. Index versions do not survive a restart, so restored pairs
+	are only asked again once their similarity has moved.
+	"""
+
+	def __init__(self, rejudge_delta=MERGE_REJUDGE_DELTA):
+		self.rejudge_delta = rejudge_delta
+		self._judged = {}
+
+	@classmethod
+	def from_memory(cls, memory, **kwargs):
+		tracker = cls(**kwargs)
+		for name_a, name_b, decision, similarity in memory.get(MERGE_JUDGED_KEY, []):
+			tracker._judged[cls._key(name_a, name_b)] = (None, decision, similarity)
+		return tracker
+
+	def save_to(self, memory):
+		"""Write the judged pairs of categories that still exist to memory[MERGE_JUDGED_KEY]."""
+		categories = memory.get('categories', {})
+		memory[MERGE_JUDGED_KEY] = [
+			[name_a, name_b, decision, similarity]
+			for (name_a, name_b), (_, decision, similarity) in sorted(self._judged.items())
+			if name_a in categories and name_b in categories
+		]
+
+	@staticmethod
+	def _key(name_a, name_b):
+		return (name_a, name_b) if name_a <= name_b else (name_b, name_a)
+
+	def _versions(self, name_a, name_b, index):
+		key = self._key(name_a, name_b)
+		return (index.versions.get(key[0]), index.versions.get(key[1]))
+
+	def is_judged(self, name_a, name_b, index, similarity=None):
+		key = self._key(name_a, name_b)
+		entry = self._judged.get(key)
+		if entry is None:
+			return False
+		if entry[0] == self._versions(name_a, name_b, index):
+			return True
+		return similarity is not None and entry[2] is not None and abs(similarity - entry[2]) <= self.rejudge_delta
+
+	def record(self, name_a, name_b, index, decision, similarity=None):
+		self._judged[self._key(name_a, name_b)] = (self._versions(name_a, name_b, index), decision, similarity)
+
+	def __len__(self):
+		return len(self._judged)
+
+
+def find_merge_candidates(index, min_similarity=MERGE_MIN_SIMILARITY, max_similarity=MERGE_MAX_SIMILARITY,
+		max_candidates=MERGE_MAX_CANDIDATES, tracker=None):
+	"""Return up to max_candidates (name_a, name_b, similarity) pairs, most similar first.
+
+	Similarities come from the index centroid matrix in row blocks, so memory
+	stays bounded for large category counts. Pairs the tracker has already
+	judged at their current versions are skipped.
+	"""
+	names = index.names
+	matrix = index.matrix
+	n = len(names)
+	pairs = []
+	with span('merge.candidates'):
+		for start in range(0, n, _BLOCK_ROWS):
+			block = matrix[start:start + _BLOCK_ROWS] @ matrix.T
+			rows, cols = np.nonzero((block >= min_similarity) & (block <= max_similarity))
+			rows = rows + start
+			upper = cols > rows
+			for i, j in zip(rows[upper], cols[upper]):
+				pairs.append((float(block[i - start, j]), int(i), int(j)))
+		pairs.sort(reverse=True)
+	candidates = []
+	for sim, i, j in pairs:
+		if tracker is not None and tracker.is_judged(names[i], names[j], index, sim):
+			continue
+		candidates.append((names[i], names[j], sim))
+		if len(candidates) >= max_candidates:
+			break
+	log.debug("%s pairs in band [%s, %s], %s candidates to judge", len(pairs), min_similarity, max_similarity, len(candidates))
+	return candidates
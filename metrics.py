@@ -0,0 +1,121 @@
+# metrics.py: Level-gated logging, timing spans and counters for the agent
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# DEBUG shows per-ticket / per-call tracing; INFO shows progress and summaries
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = '[%(funcName)s] %(message)s'
+
+_root = logging.getLogger('ticket_agent')
+if not _root.handlers:
+	_handler = logging.StreamHandler(sys.stdout)
+	_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+	_root.addHandler(_handler)
+	_root.setLevel(LOG_LEVEL)
+	_root.propagate = False
+
+
+def get_logger(name):
+	"""Return the logger for an agent module (a child of 'ticket_agent')."""
+	return logging.getLogger(f'ticket_agent.{name}')
+
+def set_log_level(level):
+	_root.setLevel(level.upper() if isinstance(level, str) else level)
+
+
+class Metrics:
+	"""Thread-safe counters and timing spans collected over a run.
+
+	Spans record count, total and max seconds per name; nested spans are
+	timed independently, so totals of nested names overlap.
+	"""
+
+	def __init__(self):
+		self._lock = threading.Lock()
+		self.reset()
+
+	def reset(self):
+		with self._lock:
+			self.counters = {}
+			self.spans = {}
+			self.started = time.time()
+
+	def incr(self, name, value=1):
+		with self._lock:
+			self.counters[name] = self.counters.get(name, 0) + value
+
+	def add_time(self, name, seconds, count=1):
+		with self._lock:
+			entry = self.spans.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+			entry['count'] += count
+			entry['total'] += seconds
+			entry['max'] = max(entry['max'], seconds)
+
+	@contextmanager
+	def span(self, name):
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add_time(name, time.perf_counter() - start)
+
+	def timed(self, name):
+		"""Decorator form of span()."""
+		def decorator(fn):
+			@wraps(fn)
+			def wrapper(*args, **kwargs):
+				with self.span(name):
+					return fn(*args, **kwargs)
+			return wrapper
+		return decorator
+
+	def snapshot(self):
+		with self._lock:
+			return {
+				'elapsed': time.time() - self.started,
+				'counters': dict(self.counters),
+				'spans': {name: dict(entry) for name, entry in self.spans.items()},
+			}
+
+	def merge(self, snapshot):
+		"""Add another process's snapshot (e.g. from a worker) into this one."""
+		for name, value in snapshot.get('counters', {}).items():
+			self.incr(name, value)
+		with self._lock:
+			for name, other in snapshot.get('spans', {}).items():
+				entry = self.spans.setdefault(name, {'count': 0, 'total': 0.0, 'max': 0.0})
+				entry['count'] += other['count']
+				entry['total'] += other['total']
+				entry['max'] = max(entry['max'], other['max'])
+
+	def report(self):
+		"""Human-readable end-of-run profile."""
+		snap = self.snapshot()
+		lines = [f"Run profile ({snap['elapsed']:.2f}s elapsed)"]
+		if snap['spans']:
+			lines.append(f"  {'span':<28}{'count':>10}{'total s':>12}{'mean ms':>12}{'max ms':>12}")
+			for name, entry in sorted(snap['spans'].items(), key=lambda item: -item[1]['total']):
+				mean = entry['total'] / entry['count'] * 1000 if entry['count'] else 0.0
+				lines.append(f"  {name:<28}{entry['count']:>10}{entry['total']:>12.3f}{mean:>12.2f}{entry['max'] * 1000:>12.2f}")
+		if snap['counters']:
+			lines.append(f"  {'counter':<28}{'value':>10}")
+			for name, value in sorted(snap['counters'].items()):
+				lines.append(f"  {name:<28}{value:>10}")
+		return '\n'.join(lines)
+
+	def dump_json(self, path):
+		with open(path, 'w', encoding='utf-8') as f:
+			json.dump(self.snapshot(), f, indent=2)
+
+
+# Process-wide instance used by all modules
+metrics = Metrics()
+incr = metrics.incr
+span = metrics.span
+timed = metrics.timed
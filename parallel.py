@@ -0,0 +1,150 @@
+# parallel.py: Shard tickets across worker processes and reconcile their category memories
+import os
+import numpy as np
+from categorization import create_category, create_categories_batch, parse_category_name, add_category, category_count, resolve_category
+from category_index import CategoryIndex
+from embeddings import get_embeddings
+from metrics import get_logger, metrics, span, incr
+
+log = get_logger(__name__)
+
+AGENT_WORKERS = int(os.getenv('AGENT_WORKERS', '1'))
+
+
+def init_worker(workers):
+	"""Process pool initializer: give each of the workers an equal share of the LLM rate limit."""
+	from llm import set_rate_share
+	set_rate_share(workers)
+
+def categorize_shard(tickets, seed_memory, threshold, cluster_threshold=None):
+	"""Worker: categorize (key, text, summary) tuples against a private copy of the memory.
+
+	The shard is embedded in one batch. Each ticket goes to its best category
+	if similarity >= threshold, otherwise a new category is created and named
+	by the LLM. With cluster_threshold set, unmatched tickets are instead
+	clustered after the pass and named once per cluster. Centroids in the
+	shard's index follow the running mean of seed and shard tickets. Returns
+	(labels, touched, observations, worker_metrics): labels maps key -> local
+	category name, touched maps each category the shard changed to the mean
+	embedding, count and examples of the shard's tickets in it and whether it
+	came from seed_memory, observations are (key, best similarity, assigned)
+	for the threshold controller and worker_metrics is the metrics snapshot
+	for this call.
+	"""
+	from llm import llm_suggest_category_name, llm_suggest_category_names
+	log.debug("pid %s: %s tickets", os.getpid(), len(tickets))
+	# Workers are reused across chunks, so report only this call's metrics
+	metrics.reset()
+	seed = seed_memory.get('categories', {})
+	index = CategoryIndex.from_memory(seed_memory)
+	touched = {}
+	labels = {}
+	observations = []
+	if not tickets:
+		return labels, touched, observations, metrics.snapshot()
+	embeddings = get_embeddings([text for _, text, _ in tickets])
+
+	def add(cat, rows):
+		entry = touched.get(cat)
+		if entry is None:
+			entry = touched[cat] = {'sum': np.zeros(embeddings.shape[1], dtype=np.float64), 'count': 0, 'examples': [], 'seeded': cat in seed}
+		entry['sum'] += embeddings[rows].sum(axis=0)
+		entry['count'] += len(rows)
+		entry['examples'].extend(tickets[i][2] for i in rows)
+		for i in rows:
+			labels[tickets[i][0]] = cat
+		base = seed.get(cat)
+		if base is None:
+			index.update(cat, entry['sum'] / entry['count'])
+		else:
+			n = category_count(base)
+			index.update(cat, (np.asarray(base['embedding'], dtype=np.float64) * n + entry['sum']) / (n + entry['count']))
+
+	unmatched = []
+	for i, ((key, text, summary), emb) in enumerate(zip(tickets, embeddings)):
+		with span('similarity.search'):
+			top = index.search(emb, k=1)
+		if top:
+			observations.append((key, top[0][1], top[0][1] >= threshold))
+		if top and top[0][1] >= threshold:
+			cat = top[0][0]
+		elif cluster_threshold is not None:
+			unmatched.append(i)
+			continue
+		else:
+			llm_response, _ = create_category(text, seed_memory, lambda t: emb, llm_suggest_category_name)
+			cat = parse_category_name(llm_response)
+		add(cat, [i])
+	if unmatched:
+		new_categories = create_categories_batch([tickets[i][1] for i in unmatched], embeddings[unmatched],
+			cluster_threshold, llm_suggest_category_names)
+		for llm_response, _, members in new_categories:
+			add(parse_category_name(llm_response), [unmatched[m] for m in members])
+	for entry in touched.values():
+		entry['embedding'] = (entry.pop('sum') / entry['count']).tolist()
+	return labels, touched, observations, metrics.snapshot()
+
+
+def reconcile_shards(shard_results, memory, index, threshold):
+	"""Merge per-shard memories into memory/index and return globally consistent labels.
+
+	Categories a shard inherited from the seed memory keep their name. Categories
+	a shard created are matched to the global memory by name first, then by
+	centroid similarity >= threshold (which also catches the same new category
+	created in two shards), and are otherwise added as new categories. Either
+	way the shard's tickets are folded in with count-weighted centroids.
+	"""
+	labels = {}
+	created = 0
+	merged = 0
+	for shard_labels, touched in shard_results:
+		mapping = {}
+		for name, entry in touched.items():
+			# A name merged or renamed away earlier in the run belongs to its surviving category
+			resolved = resolve_category(name, memory)
+			if resolved in memory['categories']:
+				target = resolved
+				merged += not entry['seeded']
+			else:
+				top = index.search(entry['embedding'], k=1)
+				if top and top[0][1] >= threshold:
+					target = top[0][0]
+					merged += 1
+				else:
+					target = resolved
+			if add_category(target, entry['examples'], entry['embedding'], memory, index, count=entry['count']):
+				created += 1
+				incr('categories.created')
+			mapping[name] = target
+		for key, name in shard_labels.items():
+			labels[key] = mapping[name]
+		incr('tickets.assigned', len(shard_labels))
+	log.info("%s shards: %s categories created, %s shard categories merged", len(shard_results), created, merged)
+	return labels
+
+
+def categorize_parallel(tickets, memory, index, threshold, pool, workers, cluster_threshold=None, controller=None):
+	"""Shard (key, text, summary) tuples round-robin across the pool and reconcile the results.
+
+	cluster_threshold is passed to categorize_shard (None = name unmatched tickets one by one).
+	The shards' best-match similarities are recorded in controller, if given,
+	under the reconciled category names.
+	"""
+	seed = {'categories': {
+		name: {'examples': [], 'embedding': data['embedding'], 'count': category_count(data)}
+		for name, data in memory.get('categories', {}).items()
+	}}
+	shards = [tickets[i::workers] for i in range(workers)]
+	futures = [pool.submit(categorize_shard, shard, seed, threshold, cluster_threshold) for shard in shards if shard]
+	results = []
+	observations = []
+	for future in futures:
+		labels, touched, shard_observations, worker_metrics = future.result()
+		metrics.merge(worker_metrics)
+		results.append((labels, touched))
+		observations.extend(shard_observations)
+	labels = reconcile_shards(results, memory, index, threshold)
+	if controller is not None:
+		for key, sim, assigned in observations:
+			controller.observe(sim, labels[key] if assigned else None)
+	return labels
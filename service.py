@@ -0,0 +1,326 @@
+# service.py: Resident categorization service keeping the model and category index warm
+#
+#   python service.py --port 8090                  (or --socket /tmp/ticket_agent.sock)
+#   curl -s localhost:8090/categorize -d '{"tickets": ["Disk space usage above 90 percent on /app"]}'
+#
+# Concurrent requests are micro-batched: the batcher thread collects tickets for up
+# to SERVICE_BATCH_WAIT seconds (or SERVICE_MAX_BATCH tickets) and embeds and scores
+# them with one encode call and one matrix multiply. It is also the only thread that
+# touches the memory and index, so no locking is needed around them.
+import argparse
+import json
+import os
+import queue
+import signal
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from memory import load_memory, save_memory
+from categorization import create_categories_batch, add_category, add_to_category, parse_category_name, resolve_category
+from category_index import CategoryIndex
+from clustering import CLUSTER_THRESHOLD
+from decision import adjust_threshold, ThresholdController, THRESHOLD_MODE, THRESHOLD_INTERVAL
+from embeddings import get_embeddings, get_model
+from metrics import get_logger, set_log_level, metrics, span, incr
+
+log = get_logger(__name__)
+
+SERVICE_MEMORY = os.getenv('SERVICE_MEMORY', os.path.join('data', 'category_memory'))
+SERVICE_THRESHOLD = float(os.getenv('SERVICE_THRESHOLD', '0.75'))
+# Most tickets embedded in one batch, and how long the batcher waits for more after the first arrives
+SERVICE_MAX_BATCH = int(os.getenv('SERVICE_MAX_BATCH', '256'))
+SERVICE_BATCH_WAIT = float(os.getenv('SERVICE_BATCH_WAIT', '0.005'))
+# Read-only: never create categories or update centroids; unmatched tickets get category null
+SERVICE_READ_ONLY = os.getenv('SERVICE_READ_ONLY', '').lower() in ('1', 'true', 'yes')
+# Seconds between saves of a changed memory (it is always saved on shutdown)
+SERVICE_SAVE_INTERVAL = float(os.getenv('SERVICE_SAVE_INTERVAL', '30'))
+SERVICE_REQUEST_TIMEOUT = float(os.getenv('SERVICE_REQUEST_TIMEOUT', '120'))
+
+_terminate_signal = None
+
+
+class Categorizer:
+	"""Owns the memory, index and threshold controller and categorizes micro-batches of tickets."""
+
+	def __init__(self, memory_path=SERVICE_MEMORY, threshold=SERVICE_THRESHOLD, read_only=SERVICE_READ_ONLY,
+			max_batch=SERVICE_MAX_BATCH, batch_wait=SERVICE_BATCH_WAIT, save_interval=SERVICE_SAVE_INTERVAL):
+		self.memory_path = memory_path
+		self.memory = load_memory(memory_path)
+		self.index = CategoryIndex.from_memory(self.memory)
+		self.threshold = threshold
+		self.controller = ThresholdController()
+		self.read_only = read_only
+		self.max_batch = max_batch
+		self.batch_wait = batch_wait
+		self.save_interval = save_interval
+		self._queue = queue.Queue()
+		self._thread = None
+		self._changed = 0
+		self._since_threshold = 0
+		self._last_save = time.monotonic()
+
+	def warm(self):
+		"""Load the model and run one encode so the first request does not pay for it."""
+		with span('service.warmup'):
+			get_model().encode(['warm up'], batch_size=1, convert_to_numpy=True, show_progress_bar=False)
+		log.info("Model warm. %s categories, threshold %s", len(self.index), self.threshold)
+
+	def start(self):
+		self._thread = threading.Thread(target=self._run, name='categorizer', daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		"""Finish queued requests, stop the batcher and save the memory."""
+		if self._thread is not None:
+			self._queue.put(None)
+			self._thread.join()
+			self._thread = None
+		self.save()
+
+	def submit(self, texts):
+		"""Queue a list of ticket texts. Returns a Future resolving to one result dict per text."""
+		future = Future()
+		if not texts:
+			future.set_result([])
+			return future
+		self._queue.put(([str(t) for t in texts], future))
+		return future
+
+	def categorize(self, texts, timeout=SERVICE_REQUEST_TIMEOUT):
+		return self.submit(texts).result(timeout)
+
+	def save(self):
+		if self._changed:
+			save_memory(self.memory_path, self.memory)
+			log.info("Saved memory after %s updates", self._changed)
+			self._changed = 0
+		self._last_save = time.monotonic()
+
+	def _next_batch(self):
+		"""Block for one request, then gather more until the batch is full or batch_wait has passed.
+
+		Returns (requests, stop).
+		"""
+		try:
+			first = self._queue.get(timeout=self.save_interval or None)
+		except queue.Empty:
+			return [], False
+		if first is None:
+			return [], True
+		batch = [first]
+		size = len(first[0])
+		deadline = time.monotonic() + self.batch_wait
+		while size < self.max_batch:
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				break
+			try:
+				item = self._queue.get(timeout=remaining)
+			except queue.Empty:
+				break
+			if item is None:
+				return batch, True
+			batch.append(item)
+			size += len(item[0])
+		return batch, False
+
+	def _run(self):
+		stop = False
+		while not stop:
+			batch, stop = self._next_batch()
+			if batch:
+				texts = [text for request_texts, _ in batch for text in request_texts]
+				try:
+					results = self._categorize(texts)
+				except Exception as exc:
+					log.exception("Batch of %s tickets failed", len(texts))
+					for _, future in batch:
+						future.set_exception(exc)
+				else:
+					start = 0
+					for request_texts, future in batch:
+						future.set_result(results[start:start + len(request_texts)])
+						start += len(request_texts)
+				incr('service.batches')
+				incr('service.requests', len(batch))
+			if self._changed and time.monotonic() - self._last_save >= self.save_interval:
+				self.save()
+
+	def _categorize(self, texts):
+		"""Assign each text to its best category (creating categories per cluster for the rest)."""
+		with span('service.batch'):
+			embeddings = get_embeddings(texts)
+			with span('similarity.search'):
+				tops = self.index.search_batch(embeddings, k=1)
+			results = []
+			unmatched = []
+			for i, top in enumerate(tops):
+				cat, score = top[0] if top else (None, 0.0)
+				assigned = cat if top and score >= self.threshold else None
+				if top:
+					self.controller.observe(score, assigned)
+				results.append({'category': assigned, 'score': float(score), 'created': False})
+				if assigned is None:
+					unmatched.append(i)
+				elif not self.read_only:
+					add_to_category(assigned, texts[i], embeddings[i], self.memory, self.index)
+			if unmatched and not self.read_only:
+				self._create(texts, embeddings, unmatched, results)
+			if not self.read_only:
+				self._changed += len(texts)
+				self._adjust_threshold(len(texts))
+		incr('service.tickets', len(texts))
+		return results
+
+	def _create(self, texts, embeddings, unmatched, results):
+		from llm import llm_suggest_category_names
+		threshold = float(CLUSTER_THRESHOLD) if CLUSTER_THRESHOLD else self.threshold
+		new_categories = create_categories_batch([texts[i] for i in unmatched], embeddings[unmatched],
+			threshold, llm_suggest_category_names)
+		for llm_response, _, members in new_categories:
+			name = resolve_category(parse_category_name(llm_response), self.memory)
+			rows = [unmatched[m] for m in members]
+			created = add_category(name, [texts[i] for i in rows], embeddings[rows].mean(axis=0), self.memory, self.index)
+			if created:
+				incr('categories.created')
+			centroid = self.index.get(name)
+			for i in rows:
+				results[i] = {'category': name, 'score': float(embeddings[i] @ centroid), 'created': created}
+
+	def _adjust_threshold(self, n):
+		self._since_threshold += n
+		if THRESHOLD_MODE == 'off' or not THRESHOLD_INTERVAL or self._since_threshold < THRESHOLD_INTERVAL:
+			return
+		self._since_threshold = 0
+		previous = self.threshold
+		self.threshold = adjust_threshold(self.memory, previous, controller=self.controller)
+		if self.threshold != previous:
+			log.info("Threshold adjusted: %s -> %s", previous, self.threshold)
+
+	def health(self):
+		return {'status': 'ok', 'categories': len(self.index), 'threshold': self.threshold,
+			'read_only': self.read_only, 'queued': self._queue.qsize()}
+
+
+def make_handler(categorizer):
+	class Handler(BaseHTTPRequestHandler):
+		def log_message(self, format, *args):
+			log.debug(format, *args)
+
+		def _send(self, status, payload):
+			body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+			self.send_response(status)
+			self.send_header('Content-Type', 'application/json')
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def do_GET(self):
+			path = self.path.rstrip('/')
+			if path == '/health':
+				self._send(200, categorizer.health())
+			elif path == '/metrics':
+				self._send(200, metrics.snapshot())
+			else:
+				self._send(404, {'error': 'not found'})
+
+		def do_POST(self):
+			"""POST /categorize with {"ticket": text} or {"tickets": [text, ...]}."""
+			if self.path.rstrip('/') != '/categorize':
+				self._send(404, {'error': 'not found'})
+				return
+			try:
+				data = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+			except ValueError:
+				self._send(400, {'error': 'invalid JSON'})
+				return
+			if not isinstance(data, dict):
+				self._send(400, {'error': 'expected a JSON object'})
+				return
+			single = 'ticket' in data
+			texts = [data['ticket']] if single else data.get('tickets')
+			if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+				self._send(400, {'error': "expected a 'ticket' string or a 'tickets' list of strings"})
+				return
+			if not texts:
+				self._send(200, {'results': []})
+				return
+			try:
+				with span('service.request'):
+					results = categorizer.categorize(texts)
+			except Exception as exc:
+				self._send(500, {'error': str(exc)})
+				return
+			self._send(200, results[0] if single else {'results': results})
+
+	return Handler
+
+
+class ServiceHTTPServer(ThreadingHTTPServer):
+	# Many clients connect at once when they rely on micro-batching; the default backlog is 5
+	request_queue_size = 128
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	daemon_threads = True
+	request_queue_size = 128
+
+	def server_bind(self):
+		if os.path.exists(self.server_address):
+			os.remove(self.server_address)
+		socketserver.UnixStreamServer.server_bind(self)
+
+
+def make_server(categorizer, host='127.0.0.1', port=8090, socket_path=None):
+	handler = make_handler(categorizer)
+	if socket_path:
+		return ThreadingUnixHTTPServer(socket_path, handler)
+	return ServiceHTTPServer((host, port), handler)
+
+def _terminate(server, signum):
+	# Only flag it: raising here could interrupt the shutdown save in serve()'s finally block.
+	# shutdown() blocks until serve_forever() returns, so it must not run on the serving thread.
+	global _terminate_signal
+	if _terminate_signal is None:
+		_terminate_signal = signum
+		threading.Thread(target=server.shutdown, name='shutdown', daemon=True).start()
+
+def serve(host='127.0.0.1', port=8090, socket_path=None, **categorizer_options):
+	categorizer = Categorizer(**categorizer_options)
+	categorizer.warm()
+	categorizer.start()
+	server = make_server(categorizer, host, port, socket_path)
+	signal.signal(signal.SIGTERM, lambda signum, frame: _terminate(server, signum))
+	log.info("Serving on %s", socket_path or f"http://{host}:{server.server_address[1]}")
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		categorizer.stop()
+		if socket_path and os.path.exists(socket_path):
+			os.remove(socket_path)
+		log.info("%s", metrics.report())
+	if _terminate_signal is not None:
+		log.info("Terminated by signal %s; memory saved.", _terminate_signal)
+		raise SystemExit(128 + _terminate_signal)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Resident ticket categorization service')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=8090)
+	parser.add_argument('--socket', help='listen on this Unix socket instead of TCP')
+	parser.add_argument('--memory', default=SERVICE_MEMORY, help='memory store directory (or .json file)')
+	parser.add_argument('--threshold', type=float, default=SERVICE_THRESHOLD)
+	parser.add_argument('--read-only', action='store_true', default=SERVICE_READ_ONLY,
+		help='only look up categories; never create categories or update centroids')
+	parser.add_argument('--log-level', help='DEBUG, INFO, WARNING or ERROR (default: LOG_LEVEL env or INFO)')
+	args = parser.parse_args()
+	if args.log_level:
+		set_log_level(args.log_level)
+	serve(args.host, args.port, args.socket, memory_path=args.memory, threshold=args.threshold, read_only=args.read_only)
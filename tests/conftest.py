@@ -0,0 +1,10 @@
+# conftest.py: Make the top-level modules importable and keep tests offline
+import os
+import sys
+
+# Set before the modules under test read them at import time
+os.environ.setdefault('EMBEDDING_MODEL', 'hashing')
+os.environ.setdefault('EMBEDDING_CACHE_PATH', '')
+os.environ.setdefault('LLM_CACHE_PATH', '')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
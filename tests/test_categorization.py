@@ -0,0 +1,48 @@
+# test_categorization.py: Category aliases across create, merge, rename and re-create
+from categorization import add_category, add_to_category, merge_categories, rename_category, resolve_category
+from category_index import CategoryIndex
+
+
+def _memory():
+	memory = {'categories': {}}
+	add_category('A', ['disk full'], [1.0, 0.0], memory)
+	add_category('B', ['disk almost full'], [0.8, 0.6], memory)
+	return memory
+
+def test_resolve_unknown_and_current_names():
+	memory = _memory()
+	assert resolve_category('A', memory) == 'A'
+	assert resolve_category('Z', memory) == 'Z'
+
+def test_merge_aliases_old_name():
+	memory = _memory()
+	merge_categories('A', 'B', memory)
+	assert 'B' not in memory['categories']
+	assert resolve_category('B', memory) == 'A'
+	assert memory['categories']['A']['count'] == 2
+
+def test_recreating_merged_name_folds_into_survivor():
+	memory = _memory()
+	index = CategoryIndex.from_memory(memory)
+	merge_categories('A', 'B', memory, index)
+	created = add_category('B', ['disk full again'], [1.0, 0.0], memory, index)
+	assert not created
+	assert 'B' not in memory['categories'] and 'B' not in index
+	assert memory['categories']['A']['count'] == 3
+	assert resolve_category('B', memory) == 'A'
+
+def test_rename_chains_through_merge_alias():
+	memory = _memory()
+	merge_categories('A', 'B', memory)
+	rename_category('A', 'Storage', memory)
+	assert resolve_category('B', memory) == 'Storage'
+	assert resolve_category('A', memory) == 'Storage'
+	add_to_category('Storage', 'volume full', [1.0, 0.0], memory)
+	assert memory['categories']['Storage']['count'] == 3
+
+def test_renaming_back_clears_alias_cycle():
+	memory = _memory()
+	rename_category('A', 'C', memory)
+	rename_category('C', 'A', memory)
+	assert resolve_category('A', memory) == 'A'
+	assert resolve_category('C', memory) == 'A'
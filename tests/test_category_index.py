@@ -0,0 +1,54 @@
+# test_category_index.py: Row bookkeeping of the centroid matrix under remove/rename
+import numpy as np
+from category_index import CategoryIndex
+
+
+def _index():
+	index = CategoryIndex()
+	index.add('A', [1.0, 0.0, 0.0])
+	index.add('B', [0.0, 1.0, 0.0])
+	index.add('C', [0.0, 0.0, 2.0])
+	return index
+
+def _assert_consistent(index):
+	assert len(index) == len(index.matrix)
+	for name in index.names:
+		assert np.allclose(index.matrix[index.names.index(name)], index.get(name))
+
+def test_remove_swaps_last_row_into_slot():
+	index = _index()
+	index.remove('A')
+	assert 'A' not in index
+	assert sorted(index.names) == ['B', 'C']
+	assert np.allclose(index.get('C'), [0.0, 0.0, 1.0])
+	assert index.search([0.0, 0.0, 1.0])[0] == ('C', 1.0)
+	assert 'A' not in index.versions
+	_assert_consistent(index)
+
+def test_remove_last_and_missing():
+	index = _index()
+	index.remove('C')
+	index.remove('missing')
+	assert index.names == ['A', 'B']
+	_assert_consistent(index)
+
+def test_rename_keeps_row_and_bumps_version():
+	index = _index()
+	version = index.versions['B']
+	index.rename('B', 'B2')
+	assert 'B' not in index and 'B2' in index
+	assert np.allclose(index.get('B2'), [0.0, 1.0, 0.0])
+	assert index.versions['B2'] == version + 1
+	assert index.search([0.0, 1.0, 0.0])[0][0] == 'B2'
+	_assert_consistent(index)
+
+def test_rename_onto_existing_name_replaces_it():
+	index = _index()
+	index.rename('A', 'C')
+	assert sorted(index.names) == ['B', 'C']
+	assert np.allclose(index.get('C'), [1.0, 0.0, 0.0])
+	_assert_consistent(index)
+	# Adding after removals still fills the next free row
+	index.add('D', [1.0, 1.0, 0.0])
+	assert len(index) == 3
+	_assert_consistent(index)
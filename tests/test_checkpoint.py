@@ -0,0 +1,35 @@
+# test_checkpoint.py: Results log flushing and resume after an interrupted write
+from checkpoint import ResultsLog
+
+
+def test_flush_and_load(tmp_path):
+	log = ResultsLog(str(tmp_path / 'results.jsonl'), flush_every=2, flush_interval=3600)
+	log.reset()
+	log.record('1', 'Disk Space')
+	assert not log.due()
+	log.record('2', 'High CPU')
+	assert log.due()
+	log.flush()
+	# Later records for the same key win
+	log.record('1', 'Storage')
+	log.flush()
+	assert ResultsLog(log.path).load() == {'1': 'Storage', '2': 'High CPU'}
+
+def test_torn_final_line_is_ignored_on_resume(tmp_path):
+	path = str(tmp_path / 'results.jsonl')
+	log = ResultsLog(path)
+	log.reset()
+	log.record('1', 'Disk Space')
+	log.record('2', 'High CPU')
+	log.flush()
+	with open(path, 'a', encoding='utf-8') as f:
+		f.write('{"key": "3", "categ')
+	resumed = ResultsLog(path)
+	assert resumed.load() == {'1': 'Disk Space', '2': 'High CPU'}
+
+def test_reset_discards_results(tmp_path):
+	log = ResultsLog(str(tmp_path / 'results.jsonl'))
+	log.record('1', 'Disk Space')
+	log.flush()
+	log.reset()
+	assert log.load() == {}
@@ -0,0 +1,42 @@
+# test_clustering.py: Leader clustering of unmatched tickets and naming one LLM call per cluster
+import numpy as np
+from clustering import leader_clusters, representatives
+from categorization import create_categories_batch
+
+
+def _unit(*rows):
+	rows = np.asarray(rows, dtype=np.float32)
+	return rows / np.linalg.norm(rows, axis=1, keepdims=True)
+
+def test_leader_clusters_groups_by_running_centroid():
+	embeddings = _unit([1, 0, 0], [0, 1, 0], [1, 0.1, 0], [0.1, 1, 0], [0, 0, 1])
+	clusters, centroids = leader_clusters(embeddings, 0.9)
+	assert clusters == [[0, 2], [1, 3], [4]]
+	assert centroids.shape == (3, 3)
+	assert np.allclose(np.linalg.norm(centroids, axis=1), 1.0)
+	assert np.allclose(centroids[0], _unit(embeddings[0] + embeddings[2])[0])
+
+def test_leader_clusters_threshold_extremes_and_empty_input():
+	embeddings = _unit([1, 0], [0.8, 0.6], [0, 1])
+	assert leader_clusters(embeddings, -1.0)[0] == [[0, 1, 2]]
+	assert leader_clusters(embeddings, 1.01)[0] == [[0], [1], [2]]
+	clusters, centroids = leader_clusters(np.zeros((0, 4), dtype=np.float32), 0.5)
+	assert clusters == [] and centroids.shape == (0, 4)
+
+def test_representatives_closest_to_centroid_first():
+	embeddings = _unit([1, 0], [0.6, 0.8], [0.9, 0.1], [0, 1])
+	assert representatives(embeddings, [1, 2, 0], np.array([1.0, 0.0], dtype=np.float32), n=2) == [0, 2]
+
+def test_create_categories_batch_names_each_cluster_once():
+	tickets = ['disk full', 'vpn down', 'disk almost full', 'vpn drops']
+	embeddings = _unit([1, 0], [0, 1], [0.95, 0.05], [0.05, 0.95])
+	calls = []
+
+	def suggest(groups):
+		calls.append(groups)
+		return [f'Category: {group[0]}' for group in groups]
+	result = create_categories_batch(tickets, embeddings, 0.9, suggest, n_representatives=1)
+	assert len(calls) == 1 and [len(group) for group in calls[0]] == [1, 1]
+	assert [members for _, _, members in result] == [[0, 2], [1, 3]]
+	assert create_categories_batch([], np.zeros((0, 2), dtype=np.float32), 0.9, suggest) == []
+	assert len(calls) == 1
@@ -0,0 +1,84 @@
+# test_decision.py: Local threshold controller statistics and suggestions
+import numpy as np
+import pytest
+import decision
+from decision import ThresholdController, _Moments, llm_adjust_threshold_step
+
+
+def _moments(values):
+	m = _Moments()
+	for v in values:
+		m.add(v)
+	return m
+
+def test_moments_merge_matches_single_pass():
+	a, b = [0.2, 0.4, 0.9], [0.5, 0.7]
+	merged = _moments(a)
+	merged.merge(_moments(b))
+	assert merged.count == 5
+	assert merged.mean == pytest.approx(np.mean(a + b))
+	assert merged.std == pytest.approx(np.std(a + b))
+	empty = _Moments()
+	empty.merge(_Moments())
+	assert empty.count == 0 and empty.std == 0.0
+	empty.merge(_moments(b))
+	assert empty.mean == pytest.approx(0.6) and empty.count == 2
+
+def _gap_controller(**kwargs):
+	controller = ThresholdController(min_samples=4, **kwargs)
+	for _ in range(4):
+		controller.observe(0.5)
+		controller.observe(0.9, 'Disk')
+	return controller
+
+def test_target_needs_enough_samples_on_both_sides_of_the_gap():
+	controller = ThresholdController(min_samples=4)
+	for _ in range(6):
+		controller.observe(0.9, 'Disk')
+	assert controller.target() is None
+	controller.observe(0.5)
+	assert controller.target() is None
+	assert controller.suggest(0.8) == 0.8
+
+def test_gap_target_is_halfway_between_inter_and_intra():
+	controller = _gap_controller()
+	# 90th percentile of the unmatched similarities (bin centre) and intra mean - std
+	assert controller.target() == pytest.approx((0.505 + 0.9) / 2)
+	assert controller.new_rate() == 0.5
+
+def test_suggest_is_rate_limited_and_bounded():
+	controller = _gap_controller(max_step=0.05)
+	assert controller.suggest(0.6) == 0.65
+	assert controller.suggest(0.8) == 0.75
+	assert controller.suggest(0.7) == round((0.505 + 0.9) / 2, 4)
+	assert _gap_controller(max_threshold=0.68).suggest(0.66) == 0.68
+	assert _gap_controller(min_threshold=0.75, max_step=1).suggest(0.8) == 0.75
+
+def test_target_new_rate_uses_best_match_quantile():
+	controller = ThresholdController(min_samples=4, target_new_rate=0.25)
+	for sim in (0.3, 0.6, 0.7, 0.8):
+		controller.observe(sim, 'A')
+	assert controller.target() == pytest.approx(0.305)
+
+def test_cohesion_follows_category_merges_and_renames():
+	controller = ThresholdController()
+	controller.observe(0.8, 'A')
+	controller.observe(0.6, 'B')
+	controller.merge_category('A', 'B')
+	controller.rename_category('A', 'C')
+	assert list(controller.cohesion) == ['C']
+	assert controller.cohesion['C'].count == 2 and controller.cohesion['C'].mean == pytest.approx(0.7)
+
+def test_llm_step_reports_ticket_counts_not_reservoir_size(monkeypatch):
+	calls = []
+
+	def fake_llm(threshold, num_categories, avg_tickets):
+		calls.append((num_categories, avg_tickets))
+		return 'DECREASE'
+	monkeypatch.setattr(decision, 'llm_adjust_threshold', fake_llm)
+	memory = {'categories': {
+		'A': {'examples': ['x'] * 50, 'count': 500},
+		'B': {'examples': ['y'] * 10},
+	}}
+	assert llm_adjust_threshold_step(memory, 0.8) == pytest.approx(0.75)
+	assert calls == [(2, 255)]
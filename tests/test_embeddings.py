@@ -0,0 +1,60 @@
+# test_embeddings.py: get_embeddings memo / disk cache hits and misses
+import numpy as np
+import pytest
+import embeddings
+from cache import SQLiteCache
+from metrics import metrics
+
+
+class CountingEncoder(embeddings.HashingEncoder):
+	def __init__(self):
+		super().__init__(dim=32)
+		self.encoded = []
+
+	def encode(self, texts, **kwargs):
+		self.encoded.extend(texts)
+		return super().encode(texts, **kwargs)
+
+@pytest.fixture
+def encoder(tmp_path, monkeypatch):
+	model = CountingEncoder()
+	monkeypatch.setattr(embeddings, '_model', model)
+	monkeypatch.setattr(embeddings, '_cache', SQLiteCache(str(tmp_path / 'embeddings.sqlite'), table='embeddings'))
+	monkeypatch.setattr(embeddings, '_memo', embeddings.OrderedDict())
+	metrics.reset()
+	return model
+
+def test_each_distinct_text_is_encoded_once(encoder):
+	vecs = embeddings.get_embeddings(['disk full', 'cpu high', 'disk full'])
+	assert vecs.shape == (3, 32)
+	assert encoder.encoded == ['disk full', 'cpu high']
+	assert np.allclose(vecs[0], vecs[2])
+	assert np.allclose(np.linalg.norm(vecs, axis=1), 1.0)
+
+def test_memo_then_disk_cache_hits(encoder, monkeypatch):
+	first = embeddings.get_embeddings(['disk full', 'cpu high'])
+	embeddings.get_embeddings(['disk full'])
+	assert encoder.encoded == ['disk full', 'cpu high']
+	assert metrics.snapshot()['counters']['embedding.memo_hits'] == 1
+
+	# A new process has an empty memo but finds the vectors on disk
+	monkeypatch.setattr(embeddings, '_memo', embeddings.OrderedDict())
+	again = embeddings.get_embeddings(['cpu high', 'disk full', 'queue depth'])
+	assert encoder.encoded == ['disk full', 'cpu high', 'queue depth']
+	assert metrics.snapshot()['counters']['embedding.cache_hits'] == 2
+	assert np.allclose(again[:2], first[::-1])
+
+def test_empty_batch_keeps_dimension(encoder):
+	assert embeddings.get_embeddings([]).shape == (0, 32)
+	assert encoder.encoded == []
+
+def test_sqlite_cache_evicts_least_recently_used(tmp_path):
+	cache = SQLiteCache(str(tmp_path / 'cache.sqlite'), max_entries=2)
+	cache.put('a', b'1')
+	cache.put('b', b'2')
+	assert cache.get('a') == b'1'
+	cache.put('c', b'3')
+	assert len(cache) == 2
+	assert cache.get('b') is None
+	assert cache.get_many(['a', 'c', 'missing']) == {'a': b'1', 'c': b'3'}
+	assert cache.stats() == {'hits': 3, 'misses': 2}
@@ -0,0 +1,83 @@
+# test_exemplar_index.py: NumPy IVF backend and top-k category voting over exemplars
+import numpy as np
+from exemplar_index import ExemplarIndex, _IVFBackend, _normalize
+
+
+def _clustered(n_clusters=20, per_cluster=50, dim=16, seed=0):
+	rng = np.random.default_rng(seed)
+	centres = _normalize(rng.normal(size=(n_clusters, dim)))
+	return _normalize(np.repeat(centres, per_cluster, axis=0) + 0.1 * rng.normal(size=(n_clusters * per_cluster, dim)))
+
+def _exact(vectors, query, k):
+	return list(np.argsort(-(vectors @ query), kind='stable')[:k])
+
+def test_ivf_is_brute_force_until_trained():
+	vectors = _clustered()
+	backend = _IVFBackend(16, train_min=10000)
+	backend.add(vectors)
+	assert backend._centroids is None
+	ids, sims = backend.search(vectors[7], 5)
+	assert list(ids) == _exact(vectors, vectors[7], 5)
+	assert np.all(np.diff(sims) <= 0)
+
+def test_ivf_trains_and_retrains_as_it_grows():
+	vectors = _clustered()
+	backend = _IVFBackend(16, train_min=100)
+	backend.add(vectors[:100])
+	assert backend._trained_size == 100 and len(backend._lists) == 16
+	backend.add(vectors[100:300])
+	# Vectors added after training are filed under their nearest list without retraining
+	assert backend._trained_size == 100
+	assert sum(len(lst) for lst in backend._lists) == 300
+	backend.add(vectors[300:])
+	assert backend._trained_size == 1000 and len(backend._lists) == 31
+	assert sorted(row for lst in backend._lists for row in lst) == list(range(1000))
+
+def test_ivf_search_recall_on_clustered_data():
+	vectors = _clustered()
+	backend = _IVFBackend(16, train_min=100, nprobe=4)
+	backend.add(vectors)
+	hits = 0
+	for q in range(0, 1000, 10):
+		ids, sims = backend.search(vectors[q], 10)
+		assert ids[0] == q and np.isclose(sims[0], 1.0)
+		hits += len(set(ids) & set(_exact(vectors, vectors[q], 10)))
+	assert hits / 1000 >= 0.9
+	# Probing every list is exact
+	backend.nprobe = len(backend._lists)
+	assert list(backend.search(vectors[3], 10)[0]) == _exact(vectors, vectors[3], 10)
+
+def _index():
+	index = ExemplarIndex(backend='ivf', dedup_similarity=0.98)
+	index.add_many('Disk', [[1.0, 0.0, 0.0], [0.9, 0.1, 0.0]])
+	index.add_many('Network', [[0.0, 1.0, 0.0], [0.1, 0.9, 0.0], [0.8, 0.2, 0.0]])
+	return index
+
+def test_vote_weights_neighbours_above_threshold():
+	index = _index()
+	winner, score, best = index.vote([1.0, 0.05, 0.0], threshold=0.9, k=3)
+	assert winner == 'Disk' and score == best
+	# Only the neighbours at or above the threshold vote
+	winner, _, _ = index.vote([0.3, 1.0, 0.0], threshold=0.9, k=5)
+	assert winner == 'Network'
+	winner, score, best = index.vote([0.0, 0.0, 1.0], threshold=0.5, k=3)
+	assert winner is None and score == best and best < 0.5
+	assert ExemplarIndex(backend='ivf').vote([1.0, 0.0], 0.5) == (None, None, None)
+
+def test_add_skips_near_duplicates_using_the_vote_memo():
+	index = _index()
+	index.vote([1.0, 0.0, 0.0], threshold=0.9, k=3)
+	assert index.add('Disk', [1.0, 0.0, 0.0]) is False
+	assert index.add('Network', [1.0, 0.0, 0.0]) is True
+	assert len(index) == 6
+
+def test_relabel_moves_exemplars_and_forgets_memoised_votes():
+	index = _index()
+	index.vote([1.0, 0.0, 0.0], threshold=0.9, k=3)
+	index.relabel('Disk', 'Storage')
+	assert not index._voted
+	assert {name for name, _ in index.search([1.0, 0.0, 0.0], k=5)} == {'Storage', 'Network'}
+	index.relabel('Storage', 'Network')
+	assert {name for name, _ in index.search([1.0, 0.0, 0.0], k=5)} == {'Network'}
+	index.relabel('Missing', 'Network')
+	assert len(index) == 5
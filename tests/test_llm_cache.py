@@ -0,0 +1,58 @@
+# test_llm_cache.py: LLM response cache keys, TTL expiry and bypass
+import pytest
+import cache
+import llm
+from cache import SQLiteCache
+
+
+class FakeClient:
+	def __init__(self, api_base='http://llm.test/v1'):
+		self.api_base = api_base
+		self.prompts = []
+
+	def complete(self, prompt, model=None):
+		self.prompts.append(prompt)
+		return f"answer {len(self.prompts)}"
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+	fake = FakeClient()
+	monkeypatch.setattr(llm, '_client', fake)
+	monkeypatch.setattr(llm, '_response_cache', None)
+	monkeypatch.setattr(llm, 'LLM_CACHE_PATH', str(tmp_path / 'llm.sqlite'))
+	monkeypatch.setattr(llm, 'LLM_CACHE_DISABLED', False)
+	return fake
+
+def test_normalized_prompt_is_served_from_cache(client):
+	assert llm.call_openrouter('Name  this\n ticket', model='m') == 'answer 1'
+	assert llm.call_openrouter('Name this ticket', model='m') == 'answer 1'
+	assert llm.call_openrouter('Name this ticket', model='other') == 'answer 2'
+	assert len(client.prompts) == 2
+
+def test_endpoints_do_not_share_entries(client, monkeypatch):
+	assert llm.call_openrouter('Name this ticket', model='m') == 'answer 1'
+	stub = FakeClient('http://127.0.0.1:8799/v1')
+	monkeypatch.setattr(llm, '_client', stub)
+	assert llm.call_openrouter('Name this ticket', model='m') == 'answer 1'
+	assert stub.prompts == ['Name this ticket']
+
+def test_bypass(client, monkeypatch):
+	llm.call_openrouter('p', model='m')
+	assert llm.call_openrouter('p', model='m', use_cache=False) == 'answer 2'
+	monkeypatch.setattr(llm, 'LLM_CACHE_DISABLED', True)
+	assert llm.call_openrouter('p', model='m') == 'answer 3'
+	assert len(client.prompts) == 3
+
+def test_ttl_expiry(tmp_path, monkeypatch):
+	now = [1000.0]
+	monkeypatch.setattr(cache.time, 'time', lambda: now[0])
+	responses = SQLiteCache(str(tmp_path / 'ttl.sqlite'), ttl=60, max_entries=1)
+	responses.put('old', b'1')
+	now[0] += 30
+	assert responses.get('old') == b'1'
+	now[0] += 31
+	assert responses.get('old') is None
+	# Expired rows are purged on the next eviction check
+	responses.put('new', b'2')
+	assert len(responses) == 1
+	assert responses.get('new') == b'2'
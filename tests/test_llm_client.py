@@ -0,0 +1,107 @@
+# test_llm_client.py: LLMClient retries/backoff and the TokenBucket rate limiter
+import pytest
+import requests
+import llm
+from llm import LLMClient, TokenBucket
+
+
+class FakeResponse:
+	def __init__(self, status_code, content='OK', headers=None):
+		self.status_code = status_code
+		self.headers = headers or {}
+		self.text = content
+		self._content = content
+
+	def json(self):
+		return {'choices': [{'message': {'content': f' {self._content} '}}]}
+
+@pytest.fixture
+def sleeps(monkeypatch):
+	delays = []
+	monkeypatch.setattr(llm.time, 'sleep', delays.append)
+	return delays
+
+def _client(responses, **kwargs):
+	client = LLMClient(api_base='http://llm.test/v1/', api_key='test', rate_limit=0, backoff_base=1.0, backoff_max=8.0, **kwargs)
+	calls = []
+
+	def post(url, data=None, timeout=None):
+		calls.append(url)
+		response = responses.pop(0)
+		if isinstance(response, Exception):
+			raise response
+		return response
+
+	client.session.post = post
+	return client, calls
+
+def test_retries_429_and_5xx_then_succeeds(sleeps):
+	client, calls = _client([FakeResponse(429), FakeResponse(503), FakeResponse(200, 'Disk Space')])
+	assert client.complete('name this') == 'Disk Space'
+	assert calls == ['http://llm.test/v1/chat/completions'] * 3
+	# Exponential backoff with jitter in [0.5, 1] x base * 2^attempt
+	assert 0.5 <= sleeps[0] <= 1.0 and 1.0 <= sleeps[1] <= 2.0
+
+def test_retry_after_header_is_honoured_and_capped(sleeps):
+	client, _ = _client([FakeResponse(429, headers={'Retry-After': '3'}), FakeResponse(429, headers={'Retry-After': '60'}),
+		FakeResponse(200)])
+	assert client.complete('x') == 'OK'
+	assert sleeps == [3.0, 8.0]
+
+def test_connection_errors_are_retried(sleeps):
+	client, calls = _client([requests.ConnectionError('reset'), requests.Timeout('slow'), FakeResponse(200)])
+	assert client.complete('x') == 'OK'
+	assert len(calls) == 3 and len(sleeps) == 2
+
+def test_gives_up_after_max_retries(sleeps):
+	client, calls = _client([FakeResponse(500, 'boom')] * 3, max_retries=2)
+	with pytest.raises(RuntimeError, match='boom'):
+		client.complete('x')
+	assert len(calls) == 3 and len(sleeps) == 2
+
+def test_client_errors_are_not_retried(sleeps):
+	client, calls = _client([FakeResponse(400, 'bad request')])
+	with pytest.raises(RuntimeError, match='bad request'):
+		client.complete('x')
+	assert len(calls) == 1 and sleeps == []
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+	now = [100.0]
+	slept = []
+	monkeypatch.setattr(llm.time, 'monotonic', lambda: now[0])
+
+	def sleep(seconds):
+		slept.append(seconds)
+		now[0] += seconds
+
+	monkeypatch.setattr(llm.time, 'sleep', sleep)
+	bucket = TokenBucket(rate=2.0, burst=3)
+	for _ in range(3):
+		bucket.acquire()
+	assert slept == []
+	bucket.acquire()
+	assert slept == [pytest.approx(0.5)]
+	now[0] += 10
+	for _ in range(3):
+		bucket.acquire()
+	assert len(slept) == 1
+
+def test_token_bucket_disabled_never_waits(monkeypatch):
+	monkeypatch.setattr(llm.time, 'sleep', lambda s: pytest.fail('slept'))
+	bucket = TokenBucket(rate=0, burst=1)
+	for _ in range(100):
+		bucket.acquire()
+
+def test_rate_share_splits_the_limit_across_workers(monkeypatch):
+	monkeypatch.setattr(llm, 'LLM_RATE_LIMIT', 8.0)
+	monkeypatch.setattr(llm, 'LLM_RATE_BURST', 10)
+	monkeypatch.setattr(llm, '_client', None)
+	monkeypatch.setattr(llm, '_rate_share', 1)
+	llm.set_rate_share(4)
+	client = llm.get_client()
+	assert client.rate_limiter.rate == 2.0
+	assert client.rate_limiter.capacity == 2
+	# A client created before the pool initializer ran is re-limited as well
+	llm.set_rate_share(2)
+	assert llm.get_client() is client
+	assert client.rate_limiter.rate == 4.0
@@ -0,0 +1,145 @@
+# test_memory_store.py: Journal/compaction round trips of the binary memory store
+import json
+import os
+import numpy as np
+import pytest
+import memory_store
+from memory_store import MemoryStore, JOURNAL_FILE
+
+
+def _memory():
+	return {
+		'categories': {
+			'Disk Space': {'examples': ['disk full on /app'], 'embedding': [1.0, 0.0, 0.0], 'count': 1},
+			'High CPU': {'examples': ['cpu at 99%', 'cpu spike'], 'embedding': [0.0, 1.0, 0.0], 'count': 2},
+		},
+		'aliases': {'Storage': 'Disk Space'},
+	}
+
+def _plain(memory):
+	"""Comparable form of a memory dict (embeddings as rounded lists)."""
+	return {
+		'categories': {
+			name: {k: (np.round(np.asarray(v, dtype=np.float64), 6).tolist() if k == 'embedding' else v) for k, v in cat.items()}
+			for name, cat in memory['categories'].items()
+		},
+		**{k: v for k, v in memory.items() if k != 'categories'},
+	}
+
+def test_save_compact_reload_round_trip(tmp_path):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	memory = store.load()
+	memory.update(_memory())
+	store.save(memory)
+
+	# Mutations after the first save go to the journal
+	memory['categories']['High CPU']['examples'].append('load average 40')
+	memory['categories']['High CPU']['embedding'] = [0.0, 0.8, 0.6]
+	memory['categories']['High CPU']['count'] = 3
+	memory['categories']['Job Failure'] = {'examples': ['batch exit 1'], 'embedding': [0.0, 0.0, 1.0], 'count': 1}
+	del memory['categories']['Disk Space']
+	memory['aliases']['Disk Space'] = 'High CPU'
+	store.save(memory)
+	store.close()
+	with open(tmp_path / 'memory' / JOURNAL_FILE, encoding='utf-8') as f:
+		assert len(f.readlines()) > 0
+
+	reloaded_store = MemoryStore(path)
+	from_journal = reloaded_store.load()
+	assert _plain(from_journal) == _plain(memory)
+
+	reloaded_store.compact(from_journal)
+	reloaded_store.close()
+	with open(tmp_path / 'memory' / JOURNAL_FILE, encoding='utf-8') as f:
+		assert f.read() == ''
+	from_base = MemoryStore(path).load()
+	assert _plain(from_base) == _plain(memory)
+
+def test_unchanged_memory_writes_nothing(tmp_path):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	memory = _memory()
+	store.save(memory)
+	store.save(memory)
+	store.close()
+	with open(tmp_path / 'memory' / JOURNAL_FILE, encoding='utf-8') as f:
+		assert f.read() == ''
+
+def test_torn_journal_line_is_ignored(tmp_path):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	memory = _memory()
+	store.save(memory)
+	memory['categories']['High CPU']['count'] = 5
+	store.save(memory)
+	store.close()
+	with open(tmp_path / 'memory' / JOURNAL_FILE, 'a', encoding='utf-8') as f:
+		f.write(json.dumps({'op': 'delete', 'name': 'High CPU'})[:12])
+	reloaded = MemoryStore(path).load()
+	assert reloaded['categories']['High CPU']['count'] == 5
+
+def test_in_place_embedding_updates_are_journaled(tmp_path):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	memory = _memory()
+	memory['categories']['High CPU']['embedding'] = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+	store.save(memory)
+	memory['categories']['Disk Space']['embedding'][:] = [0.6, 0.8, 0.0]
+	memory['categories']['High CPU']['embedding'] += np.float32(0.5)
+	store.save(memory)
+	store.close()
+	reloaded = MemoryStore(path).load()
+	assert np.allclose(reloaded['categories']['Disk Space']['embedding'], [0.6, 0.8, 0.0])
+	assert np.allclose(reloaded['categories']['High CPU']['embedding'], [0.5, 1.5, 0.5])
+
+def test_crash_before_meta_replace_keeps_previous_base(tmp_path, monkeypatch):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	memory = _memory()
+	store.compact(memory)
+	store.close()
+	changed = _memory()
+	del changed['categories']['Disk Space']
+	changed['categories']['Job Failure'] = {'examples': [], 'embedding': [0.0, 0.0, 1.0], 'count': 1}
+
+	def interrupted(src, dst):
+		raise KeyboardInterrupt
+
+	monkeypatch.setattr(memory_store.os, 'replace', interrupted)
+	with pytest.raises(KeyboardInterrupt):
+		MemoryStore(path).compact(changed)
+	monkeypatch.undo()
+	assert _plain(MemoryStore(path).load()) == _plain(memory)
+
+	# The next compaction reuses the orphaned generation's file names
+	store = MemoryStore(path)
+	store.compact(changed)
+	store.close()
+	assert _plain(MemoryStore(path).load()) == _plain(changed)
+	assert sorted(f for f in os.listdir(path) if f.startswith(('centroids', 'examples'))) == ['centroids.2.npy', 'examples.2.json']
+
+def test_mismatched_centroid_rows_are_detected(tmp_path):
+	path = str(tmp_path / 'memory')
+	store = MemoryStore(path)
+	store.compact(_memory())
+	store.close()
+	meta = json.loads((tmp_path / 'memory' / 'meta.json').read_text(encoding='utf-8'))
+	np.save(tmp_path / 'memory' / meta['centroids'], np.zeros((3, 3), dtype=np.float32))
+	with pytest.raises(ValueError, match='inconsistent'):
+		MemoryStore(path).load()
+
+def test_store_without_generations_still_loads(tmp_path):
+	directory = tmp_path / 'memory'
+	directory.mkdir()
+	np.save(directory / 'centroids.npy', np.eye(2, dtype=np.float32))
+	(directory / 'examples.json').write_text(json.dumps({'A': ['a'], 'B': []}), encoding='utf-8')
+	(directory / 'meta.json').write_text(json.dumps({'names': ['A', 'B'], 'fields': {'A': {'count': 1}}, 'extra': {}}), encoding='utf-8')
+	store = MemoryStore(str(directory))
+	memory = store.load()
+	assert memory['categories']['A']['examples'] == ['a']
+	assert np.allclose(memory['categories']['B']['embedding'], [0.0, 1.0])
+	store.compact(memory)
+	store.close()
+	assert not (directory / 'centroids.npy').exists()
+	assert _plain(MemoryStore(str(directory)).load()) == _plain(memory)
@@ -0,0 +1,52 @@
+# test_merge_candidates.py: Candidate ranking and MergeTracker re-judge rules
+from category_index import CategoryIndex
+from merge_candidates import MergeTracker, find_merge_candidates
+
+
+def _index():
+	index = CategoryIndex()
+	index.add('A', [1.0, 0.0, 0.0])
+	index.add('B', [0.9, 0.1, 0.0])
+	index.add('C', [0.7, 0.7, 0.0])
+	index.add('D', [0.0, 0.0, 1.0])
+	return index
+
+def test_candidates_in_band_most_similar_first():
+	candidates = find_merge_candidates(_index(), min_similarity=0.6, max_similarity=1.0, max_candidates=5)
+	assert [(a, b) for a, b, _ in candidates] == [('A', 'B'), ('B', 'C'), ('A', 'C')]
+	assert candidates[0][2] > candidates[1][2] > candidates[2][2]
+	assert len(find_merge_candidates(_index(), min_similarity=0.6, max_candidates=1)) == 1
+
+def test_judged_pair_is_skipped_until_centroid_changes():
+	index = _index()
+	tracker = MergeTracker(rejudge_delta=0.02)
+	tracker.record('B', 'A', index, False)
+	assert tracker.is_judged('A', 'B', index)
+	candidates = find_merge_candidates(index, min_similarity=0.6, tracker=tracker)
+	assert ('A', 'B') not in [(a, b) for a, b, _ in candidates]
+	# A version bump without a recorded similarity makes the pair eligible again
+	index.update('A', [1.0, 0.01, 0.0])
+	assert not tracker.is_judged('A', 'B', index)
+
+def test_small_similarity_drift_is_not_rejudged():
+	index = _index()
+	tracker = MergeTracker(rejudge_delta=0.02)
+	tracker.record('A', 'B', index, False, similarity=0.99)
+	index.update('A', [1.0, 0.01, 0.0])
+	assert tracker.is_judged('A', 'B', index, similarity=0.985)
+	assert not tracker.is_judged('A', 'B', index, similarity=0.95)
+
+def test_judged_pairs_survive_a_restart():
+	index = _index()
+	memory = {'categories': {name: {} for name in 'ABC'}}
+	tracker = MergeTracker(rejudge_delta=0.02)
+	tracker.record('A', 'B', index, False, similarity=0.99)
+	tracker.record('A', 'D', index, False, similarity=0.1)
+	tracker.save_to(memory)
+	# D no longer exists, so its pair is dropped
+	assert memory['merge_judged'] == [['A', 'B', False, 0.99]]
+	restored = MergeTracker.from_memory(memory, rejudge_delta=0.02)
+	fresh_index = _index()
+	assert restored.is_judged('A', 'B', fresh_index, similarity=0.99)
+	assert not restored.is_judged('A', 'B', fresh_index, similarity=0.9)
+	assert not restored.is_judged('A', 'C', fresh_index, similarity=0.8)
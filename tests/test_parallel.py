@@ -0,0 +1,40 @@
+# test_parallel.py: Reconciling per-shard category memories into the global memory
+import numpy as np
+from category_index import CategoryIndex
+from parallel import reconcile_shards
+
+
+def _touched(embedding, count, seeded=False):
+	return {'embedding': embedding, 'count': count, 'examples': [f'ticket {i}' for i in range(count)], 'seeded': seeded}
+
+def _memory():
+	return {'categories': {'Disk': {'examples': ['disk full'], 'embedding': [1.0, 0.0, 0.0], 'count': 1}},
+		'aliases': {'Storage': 'Disk'}}
+
+def test_same_new_category_from_two_shards_is_merged():
+	memory = _memory()
+	index = CategoryIndex.from_memory(memory)
+	shards = [
+		({'a': 'Network'}, {'Network': _touched([0.0, 1.0, 0.0], 1)}),
+		# Another shard named the same tickets differently; centroid similarity maps it onto the first
+		({'b': 'Connectivity', 'c': 'Connectivity'}, {'Connectivity': _touched([0.0, 0.99, 0.1], 2)}),
+	]
+	labels = reconcile_shards(shards, memory, index, threshold=0.9)
+	assert labels == {'a': 'Network', 'b': 'Network', 'c': 'Network'}
+	assert set(memory['categories']) == {'Disk', 'Network'}
+	assert memory['categories']['Network']['count'] == 3
+	assert np.allclose(memory['categories']['Network']['embedding'], [0.0, (1.0 + 2 * 0.99) / 3, 0.2 / 3])
+
+def test_seeded_and_aliased_names_fold_into_existing_categories():
+	memory = _memory()
+	index = CategoryIndex.from_memory(memory)
+	shards = [
+		({'a': 'Disk'}, {'Disk': _touched([1.0, 0.0, 0.0], 1, seeded=True)}),
+		({'b': 'Storage'}, {'Storage': _touched([0.0, 0.0, 1.0], 1)}),
+		({'c': 'Printer'}, {'Printer': _touched([0.0, 0.0, 1.0], 1)}),
+	]
+	labels = reconcile_shards(shards, memory, index, threshold=0.9)
+	assert labels == {'a': 'Disk', 'b': 'Disk', 'c': 'Printer'}
+	assert memory['categories']['Disk']['count'] == 3
+	assert 'Storage' not in memory['categories']
+	assert index.names == list(memory['categories'])
@@ -0,0 +1,53 @@
+# test_reservoir.py: Category examples as uniform reservoir samples, also across merges
+import random
+import pytest
+import categorization
+from categorization import _reservoir_add, _reservoir_merge
+
+
+@pytest.fixture(autouse=True)
+def rng(monkeypatch):
+	monkeypatch.setattr(categorization, '_reservoir_rng', random.Random(1))
+
+def test_add_fills_then_keeps_cap():
+	examples = []
+	for count in range(1, 26):
+		_reservoir_add(examples, count, count, cap=10)
+		assert len(examples) == min(count, 10)
+	assert examples[:10] != list(range(1, 11))
+	assert len(set(examples)) == 10
+
+def test_add_shrinks_an_oversized_reservoir():
+	# Memories written before the cap was lowered can hold more examples than allowed
+	examples = list(range(30))
+	_reservoir_add(examples, 31, 'new', cap=10)
+	assert len(examples) == 10
+
+def test_add_samples_the_stream_uniformly():
+	hits = [0] * 100
+	trials = 2000
+	for _ in range(trials):
+		examples = []
+		for count in range(1, 101):
+			_reservoir_add(examples, count, count - 1, cap=10)
+		for item in examples:
+			hits[item] += 1
+	# Every item is kept with probability cap / n = 0.1, early or late
+	assert 0.08 < sum(hits[:10]) / (10 * trials) < 0.12
+	assert 0.08 < sum(hits[-10:]) / (10 * trials) < 0.12
+
+def test_merge_small_reservoirs_are_concatenated():
+	assert _reservoir_merge(['a'], 1, ['b', 'c'], 2, cap=5) == ['a', 'b', 'c']
+	assert _reservoir_merge([], 0, ['b'], 1, cap=5) == ['b']
+
+def test_merge_draws_in_proportion_to_ticket_counts():
+	a = [f'a{i}' for i in range(10)]
+	b = [f'b{i}' for i in range(10)]
+	from_a = 0
+	trials = 500
+	for _ in range(trials):
+		merged = _reservoir_merge(a, 900, b, 100, cap=10)
+		assert len(merged) == 10 and len(set(merged)) == 10
+		from_a += sum(item.startswith('a') for item in merged)
+	assert 8.5 < from_a / trials < 9.5
+	assert a == [f'a{i}' for i in range(10)]
@@ -0,0 +1,84 @@
+# test_service.py: Micro-batching, request validation and shutdown of the resident service
+import http.client
+import json
+import signal
+import threading
+import pytest
+import service
+from service import Categorizer, make_server
+
+
+@pytest.fixture
+def categorizer(tmp_path):
+	return Categorizer(memory_path=str(tmp_path / 'memory'), read_only=True, max_batch=4, batch_wait=0.05, save_interval=0)
+
+def test_sigterm_shuts_the_server_down_without_raising(categorizer, monkeypatch):
+	monkeypatch.setattr(service, '_terminate_signal', None)
+	server = make_server(categorizer, port=0)
+	thread = threading.Thread(target=server.serve_forever)
+	thread.start()
+	try:
+		service._terminate(server, signal.SIGTERM)
+		# A second signal while shutting down is ignored
+		service._terminate(server, signal.SIGTERM)
+		thread.join(5)
+		assert not thread.is_alive()
+		assert service._terminate_signal == signal.SIGTERM
+	finally:
+		server.server_close()
+
+def _request(texts):
+	return (list(texts), None)
+
+def test_next_batch_stops_at_max_batch(categorizer):
+	for texts in (['a', 'b'], ['c', 'd'], ['e']):
+		categorizer._queue.put(_request(texts))
+	batch, stop = categorizer._next_batch()
+	assert [texts for texts, _ in batch] == [['a', 'b'], ['c', 'd']] and not stop
+	batch, stop = categorizer._next_batch()
+	assert [texts for texts, _ in batch] == [['e']] and not stop
+
+def test_next_batch_returns_queued_requests_before_stopping(categorizer):
+	categorizer._queue.put(_request(['a']))
+	categorizer._queue.put(None)
+	batch, stop = categorizer._next_batch()
+	assert [texts for texts, _ in batch] == [['a']] and stop
+	categorizer._queue.put(None)
+	assert categorizer._next_batch() == ([], True)
+
+def test_next_batch_times_out_for_periodic_saves(categorizer):
+	categorizer.save_interval = 0.01
+	assert categorizer._next_batch() == ([], False)
+
+@pytest.fixture
+def server(categorizer):
+	server = make_server(categorizer.start(), port=0)
+	thread = threading.Thread(target=server.serve_forever, daemon=True)
+	thread.start()
+	yield server
+	server.shutdown()
+	server.server_close()
+	categorizer.stop()
+
+def _post(server, body):
+	conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+	try:
+		conn.request('POST', '/categorize', body=body)
+		response = conn.getresponse()
+		return response.status, json.loads(response.read())
+	finally:
+		conn.close()
+
+@pytest.mark.parametrize('body', [b'not json', b'["disk full"]', b'{"ticket": 5}', b'{"tickets": "disk full"}',
+	b'{"tickets": ["disk full", null]}'])
+def test_invalid_requests_get_400(server, body):
+	status, payload = _post(server, body)
+	assert status == 400 and 'error' in payload
+
+def test_valid_requests(server):
+	assert _post(server, b'{"tickets": []}') == (200, {'results': []})
+	status, payload = _post(server, json.dumps({'tickets': ['disk full', 'vpn down']}).encode())
+	# Read-only with an empty memory: nothing matches and nothing is created
+	assert status == 200 and [r['category'] for r in payload['results']] == [None, None]
+	status, payload = _post(server, b'{"ticket": "disk full"}')
+	assert status == 200 and payload['category'] is None
@@ -0,0 +1,63 @@
+# test_write_output.py: Output labels, incremental merges with the previous output and chunk independence
+import pandas as pd
+import pytest
+from agent import write_output, ticket_keys
+from ticket_io import iter_ticket_chunks
+
+
+def _tickets():
+	# Integer IDs with a blank cell: per-chunk dtype inference would turn 1 into '1.0' in some chunks
+	return pd.DataFrame({
+		'Incident ID': pd.Series([1, 2, None, 4, 5], dtype=object),
+		'Summary*': ['disk full', 'cpu high', 'no id ticket', 'disk full', 'queue depth'],
+	})
+
+def _keys(path, chunk_size):
+	keys = []
+	for chunk in iter_ticket_chunks(path, chunk_size, ['Summary*', 'Incident ID']):
+		keys.extend(ticket_keys(chunk, 'Summary*', 'Incident ID'))
+	return keys
+
+@pytest.mark.parametrize('ext', ['.csv', '.jsonl'])
+def test_keys_independent_of_chunk_size(tmp_path, ext):
+	path = str(tmp_path / f'tickets{ext}')
+	df = _tickets()
+	if ext == '.csv':
+		df.to_csv(path, index=False)
+	else:
+		df.to_json(path, orient='records', lines=True)
+	keys = _keys(path, 10)
+	assert keys[:2] == ['1', '2'] and keys[3:] == ['4', '5']
+	assert keys[2].startswith('sha256:')
+	for chunk_size in (1, 2, 3):
+		assert _keys(path, chunk_size) == keys
+
+def test_output_labels_consistent_across_chunk_sizes(tmp_path):
+	input_file = str(tmp_path / 'tickets.csv')
+	_tickets().to_csv(input_file, index=False)
+	keys = _keys(input_file, 10)
+	results = dict(zip(keys, ['Disk', 'CPU', 'Other', 'Disk', 'Queue']))
+	memory = {'categories': {'Storage': {}, 'CPU': {}, 'Other': {}, 'Queue': {}}, 'aliases': {'Disk': 'Storage'}}
+	outputs = []
+	for chunk_size in (1, 2, 10):
+		output_file = str(tmp_path / f'out_{chunk_size}.csv')
+		write_output(input_file, output_file, 'Summary*', 'Incident ID', results, memory, chunk_size=chunk_size)
+		outputs.append(pd.read_csv(output_file))
+	assert outputs[0]['Category'].tolist() == ['Storage', 'CPU', 'Other', 'Storage', 'Queue']
+	for other in outputs[1:]:
+		pd.testing.assert_frame_equal(other, outputs[0])
+
+def test_previous_output_rows_are_kept_and_resolved(tmp_path):
+	previous = str(tmp_path / 'out.csv')
+	pd.DataFrame({'Incident ID': [7, 1], 'Summary*': ['old ticket', 'disk full'], 'Category': ['Disk', 'Stale']}).to_csv(previous, index=False)
+	input_file = str(tmp_path / 'tickets.csv')
+	_tickets().to_csv(input_file, index=False)
+	keys = _keys(input_file, 10)
+	results = dict(zip(keys, ['Disk', 'CPU', 'Other', 'Disk', 'Queue']))
+	memory = {'categories': {}, 'aliases': {'Disk': 'Storage'}}
+	write_output(input_file, previous, 'Summary*', 'Incident ID', results, memory, skip_keys=set(keys),
+		previous_file=previous, chunk_size=2)
+	out = pd.read_csv(previous)
+	# Ticket 1 is in this run, so only ticket 7 is kept from the previous output, with its alias resolved
+	assert out['Incident ID'].tolist()[:2] == [7, 1]
+	assert out['Category'].tolist() == ['Storage', 'Storage', 'CPU', 'Other', 'Storage', 'Queue']
@@ -0,0 +1,181 @@
+# ticket_io.py: Streaming, chunked ticket reading and writing for CSV / JSONL / Parquet / Excel
+import csv
+import json
+import math
+import os
+import pandas as pd
+from metrics import get_logger, span
+
+log = get_logger(__name__)
+
+TICKET_CHUNK_SIZE = int(os.getenv('TICKET_CHUNK_SIZE', '5000'))
+# Rows read to detect the text and ID columns
+TICKET_SAMPLE_ROWS = int(os.getenv('TICKET_SAMPLE_ROWS', '1000'))
+
+
+def _format(path):
+	ext = os.path.splitext(path)[1].lower()
+	if ext in ('.csv', '.txt'):
+		return 'csv'
+	if ext in ('.jsonl', '.ndjson'):
+		return 'jsonl'
+	if ext in ('.parquet', '.pq'):
+		return 'parquet'
+	if ext in ('.xlsx', '.xlsm'):
+		return 'excel'
+	raise ValueError(f"Unsupported ticket file format: {path}")
+
+def _iter_excel(path, chunk_size):
+	from openpyxl import load_workbook
+	# read_only streams rows from the sheet XML instead of building the whole workbook
+	workbook = load_workbook(path, read_only=True, data_only=True)
+	try:
+		rows = workbook.active.iter_rows(values_only=True)
+		header = next(rows, None)
+		if header is None:
+			return
+		columns = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+		batch = []
+		for row in rows:
+			if all(value is None for value in row):
+				continue
+			batch.append(row)
+			if len(batch) >= chunk_size:
+				yield pd.DataFrame(batch, columns=columns)
+				batch = []
+		if batch:
+			yield pd.DataFrame(batch, columns=columns)
+	finally:
+		workbook.close()
+
+def _iter_parquet(path, chunk_size):
+	try:
+		import pyarrow.parquet as pq
+	except ImportError as e:
+		raise ImportError("Reading Parquet tickets requires pyarrow (pip install pyarrow)") from e
+	for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+		yield batch.to_pandas()
+
+def _as_str(value):
+	"""Text form of a cell independent of the dtype pandas inferred for its chunk (5, 5.0 -> '5')."""
+	if value is None or (isinstance(value, float) and math.isnan(value)):
+		return value
+	if hasattr(value, 'item'):
+		value = value.item()
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	return str(value)
+
+def iter_ticket_chunks(path, chunk_size=TICKET_CHUNK_SIZE, str_columns=()):
+	"""Yield DataFrames of at most chunk_size tickets.
+
+	Chunks are indexed by global row number, so (chunk.index) identifies a row
+	across the whole file. Only one chunk is held in memory at a time.
+	str_columns (where present) are read as text, so values such as ticket IDs
+	do not depend on which other values share their chunk; missing cells stay NaN.
+	"""
+	fmt = _format(path)
+	log.info("Streaming %s tickets from %s in chunks of %s", fmt, path, chunk_size)
+	str_columns = [c for c in str_columns if c is not None]
+	if fmt == 'csv':
+		chunks = pd.read_csv(path, chunksize=chunk_size, dtype={c: str for c in str_columns})
+	elif fmt == 'jsonl':
+		chunks = pd.read_json(path, lines=True, chunksize=chunk_size)
+	elif fmt == 'parquet':
+		chunks = _iter_parquet(path, chunk_size)
+	else:
+		chunks = _iter_excel(path, chunk_size)
+	offset = 0
+	while True:
+		with span('input.read'):
+			chunk = next(chunks, None)
+		if chunk is None:
+			return
+		if fmt != 'csv':
+			for col in str_columns:
+				if col in chunk.columns:
+					chunk[col] = chunk[col].map(_as_str).astype(object)
+		chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+		offset += len(chunk)
+		yield chunk
+
+def sample_tickets(path, rows=TICKET_SAMPLE_ROWS):
+	"""Return the first rows of a ticket file without reading the rest."""
+	chunks = iter_ticket_chunks(path, rows)
+	try:
+		return next(chunks)
+	except StopIteration:
+		return pd.DataFrame()
+	finally:
+		chunks.close()
+
+
+def _cell(value):
+	if value is None or (isinstance(value, float) and math.isnan(value)):
+		return None
+	if hasattr(value, 'item'):
+		# NumPy scalars
+		return value.item()
+	return value
+
+class TicketWriter:
+	"""Append DataFrame chunks to a CSV, JSONL or Excel file without holding them all in memory.
+
+	The column order is fixed by the first chunk written; later chunks are
+	aligned to it. Use as a context manager so the file is always finalized.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self.format = _format(path)
+		if self.format == 'parquet':
+			raise ValueError("Writing Parquet output is not supported; use .csv, .jsonl or .xlsx")
+		self.columns = None
+		self.rows = 0
+		self._file = None
+		self._workbook = None
+		self._sheet = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		self.close()
+
+	def write(self, df):
+		if self.columns is None:
+			self.columns = list(df.columns)
+			self._open()
+		df = df.reindex(columns=self.columns)
+		if self.format == 'csv':
+			df.to_csv(self._file, header=False, index=False)
+		elif self.format == 'jsonl':
+			for record in df.to_dict(orient='records'):
+				self._file.write(json.dumps({k: _cell(v) for k, v in record.items()}, ensure_ascii=False, default=str) + '\n')
+		else:
+			for row in df.itertuples(index=False, name=None):
+				self._sheet.append([_cell(v) for v in row])
+		self.rows += len(df)
+
+	def _open(self):
+		if self.format == 'excel':
+			from openpyxl import Workbook
+			self._workbook = Workbook(write_only=True)
+			self._sheet = self._workbook.create_sheet()
+			self._sheet.append([str(c) for c in self.columns])
+			return
+		self._file = open(self.path, 'w', encoding='utf-8', newline='')
+		if self.format == 'csv':
+			csv.writer(self._file).writerow(self.columns)
+
+	def close(self):
+		if self.columns is None:
+			# Nothing was written; still leave a valid, empty output behind
+			self.columns = []
+			self._open()
+		if self._workbook is not None:
+			self._workbook.save(self.path)
+			self._workbook = None
+		elif self._file is not None:
+			self._file.close()
+			self._file = None